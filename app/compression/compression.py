@@ -0,0 +1,118 @@
+"""
+Данный файл реализует динамическое сжатие ответов приложения (gzip и brotli) с выбором кодировки
+по заголовку Accept-Encoding, порогами по типу содержимого и минимальному размеру, а также потоковым
+сжатием для ответов-генераторов.
+"""
+
+import zlib
+import logging.config
+from flask import request
+from log_set.log_setting import LOGGING
+
+try:
+    import brotli
+except ImportError:
+    # brotli - необязательная зависимость, без нее используется только gzip
+    brotli = None
+
+# Настройка логирования
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('log')
+
+# Значения по умолчанию, переопределяются через app.config
+DEFAULTS = {
+    'COMPRESS_MIMETYPES': {'text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript'},
+    'COMPRESS_MIN_SIZE': 500,
+    'COMPRESS_LEVEL': 6,
+    'COMPRESS_BR_LEVEL': 4,
+}
+
+
+def _choose_encoding():
+    """
+        Выбирает кодировку сжатия по заголовку Accept-Encoding.
+
+        Возвращает:
+            str | None: 'br', 'gzip' или None, если клиент не поддерживает сжатие.
+        """
+    supported = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(supported)
+
+
+def _compressor(encoding, config):
+    """
+        Создает потоковый компрессор для выбранной кодировки.
+
+        Возвращает:
+            tuple: Функции (compress, sync, finish) компрессора: сжатие части данных, сброс
+                   накопленных данных без завершения потока и завершение потока.
+        """
+    if encoding == 'br':
+        comp = brotli.Compressor(quality=config['COMPRESS_BR_LEVEL'])
+        return comp.process, comp.flush, comp.finish
+    comp = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+    return comp.compress, lambda: comp.flush(zlib.Z_SYNC_FLUSH), comp.flush
+
+
+def _stream(iterable, compress, sync, finish):
+    """
+        Сжимает ответ-генератор по частям, не собирая его целиком в памяти.
+
+        После каждой части компрессор сбрасывается, чтобы клиент получал данные по мере их
+        генерации, а не одним блоком в конце.
+        """
+    for chunk in iterable:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compress(chunk) + sync()
+        if data:
+            yield data
+    yield finish()
+
+
+def setup_compression(app):
+    """
+        Настраивает сжатие ответов для приложения Flask.
+
+        Аргументы:
+            app: Экземпляр приложения Flask, к ответам которого применяется сжатие.
+        """
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    @app.after_request
+    def compress_response(response):
+        """
+            Сжимает ответ, если клиент это поддерживает и ответ подходит по типу и размеру.
+            """
+        config = app.config
+        if response.mimetype not in config['COMPRESS_MIMETYPES']:
+            return response
+
+        # Vary выставляется до проверки статуса, чтобы его получали и ответы 304
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        encoding = _choose_encoding()
+        if not encoding:
+            return response
+        if not response.is_streamed and response.calculate_content_length() < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        compress, sync, finish = _compressor(encoding, config)
+        if response.is_streamed:
+            response.response = _stream(response.response, compress, sync, finish)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(compress(response.get_data()) + finish())
+
+        # Сильный ETag не должен совпадать у сжатого и несжатого представлений
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+        response.headers['Content-Encoding'] = encoding
+        return response
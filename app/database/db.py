@@ -3,10 +3,16 @@
 моделей данных и Pydantic для валидации входящих данных.
 """
 
+import os
 import logging.config
+from datetime import date, datetime
+from functools import wraps
+from flask import g, request, has_request_context
 from pydantic import BaseModel
-from sqlalchemy import Column, String, Integer, ForeignKey
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import Column, String, Integer, ForeignKey, Index
+from sqlalchemy import (create_engine, MetaData, event, inspect, text, select, insert, update, delete, func, literal,
+                        or_)
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
 from log_set.log_setting import LOGGING
@@ -15,15 +21,92 @@ from log_set.log_setting import LOGGING
 logging.config.dictConfig(LOGGING)
 logger = logging.getLogger('log')
 
-# URL для подключения к базе данных
-DATABASE_URL = "sqlite:///../data.db"
+# URL для подключения к базе данных (можно переопределить переменной окружения DATABASE_URL)
+DATABASE_URL = os.environ.get('DATABASE_URL', "sqlite:///../data.db")
+
+# URL реплики только для чтения (для не-SQLite бэкендов). Если не задан, для SQLite
+# используется тот же файл, открытый в режиме mode=ro
+DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL')
+
+# Размер пула соединений только для чтения
+READ_POOL_SIZE = 10
+
+# HTTP-методы, которые по умолчанию обслуживаются сессией только для чтения
+READ_METHODS = {'GET', 'HEAD'}
 
 # Создание движка базы данных с использованием SQLAlchemy
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
-# Создание локальной сессии для работы с базой данных
+
+@event.listens_for(engine, 'connect')
+def _set_sqlite_wal(dbapi_connection, connection_record):
+    """
+        Включает режим WAL для SQLite, чтобы читатели не блокировались единственным писателем.
+        """
+    if engine.dialect.name == 'sqlite':
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.close()
+
+
+def _make_read_engine():
+    """
+        Создает движок для пула соединений только для чтения.
+
+        Возвращает:
+            Engine: Движок реплики (DATABASE_READ_URL), движок SQLite-файла в режиме mode=ro
+            или основной движок, если отдельный пул невозможен (например, БД в памяти).
+        """
+    if DATABASE_READ_URL:
+        return create_engine(DATABASE_READ_URL, pool_size=READ_POOL_SIZE)
+
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return engine
+
+    read_url = url.set(database=f'file:{url.database}',
+                       query={**url.query, 'mode': 'ro', 'uri': 'true'})
+    return create_engine(read_url, connect_args={"check_same_thread": False}, pool_size=READ_POOL_SIZE)
+
+
+read_engine = _make_read_engine()
+
+# Создание локальной сессии для работы с базой данных (запись)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Создание сессии только для чтения, привязанной к отдельному пулу
+SessionRead = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+def read_only(view):
+    """
+        Декоратор представления, помечающий его как только читающее из базы данных.
+
+        Все сессии, полученные через get_session() внутри представления, будут взяты
+        из пула только для чтения независимо от HTTP-метода.
+        """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def get_session():
+    """
+        Возвращает сессию базы данных, подходящую для текущего запроса.
+
+        Запросы GET/HEAD и представления, помеченные декоратором read_only, получают сессию
+        из пула только для чтения, остальные - сессию записи.
+
+        Возвращает:
+            Session: Новая сессия SQLAlchemy.
+        """
+    if has_request_context() and (g.get('db_read_only') or request.method in READ_METHODS):
+        return SessionRead()
+    return SessionLocal()
+
 # Создание метаданных и базового класса для декларативного определения моделей
 metadata = MetaData()
 Base = declarative_base()
@@ -45,11 +128,17 @@ class TourTable(Base):
             occupied_places (int): Количество занятых мест.
             price_per_person (int): Цена за человека.
             image_path (str): Путь к изображению тура.
+            version (int): Версия строки, увеличивается при каждом изменении тура.
 
         Связи:
             users (relationship): Связь с моделью UserTable.
         """
     __tablename__ = 'tours'
+    __table_args__ = (
+        # Индекс для выборки предстоящих туров и поиска туров для архивации; покрывает и вычисление
+        # ETag списка предстоящих туров по парам (id, version) без чтения самих строк
+        Index('ix_tours_start_date_id_version', 'start_date_tour', 'id', 'version'),
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(String, nullable=False)
@@ -62,9 +151,14 @@ class TourTable(Base):
     occupied_places = Column(Integer, nullable=False)
     price_per_person = Column(Integer, nullable=False)
     image_path = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
     users = relationship("UserTable", back_populates="tour")
 
+    # Оптимистическая блокировка: UPDATE выполняется с условием на версию и увеличивает ее,
+    # при несовпадении SQLAlchemy выбрасывает StaleDataError
+    __mapper_args__ = {'version_id_col': version}
+
 
 class UserTable(Base):
     """
@@ -88,11 +182,260 @@ class UserTable(Base):
     email = Column(String)
     phone = Column(Integer)
     number_of_people = Column(Integer)
-    tour_id = Column(Integer, ForeignKey('tours.id'))
+    tour_id = Column(Integer, ForeignKey('tours.id'), index=True)
 
     tour = relationship("TourTable", back_populates="users")
 
 
+class TourArchiveTable(Base):
+    """
+        Модель таблицы 'tours_archive' для хранения прошедших туров.
+
+        Атрибуты совпадают с TourTable, дополнительно:
+            archive_id (int): Уникальный идентификатор записи архива (id тура SQLite может
+                переиспользовать после удаления).
+            archived_at (str): Дата и время переноса тура в архив.
+
+        Связи:
+            users (relationship): Связь с моделью UserArchiveTable.
+        """
+    __tablename__ = 'tours_archive'
+
+    archive_id = Column(Integer, primary_key=True)
+    id = Column(Integer, nullable=False, index=True)
+    title = Column(String, nullable=False)
+    description = Column(String, nullable=False)
+    place = Column(String, nullable=False)
+    start_date_tour = Column(String, nullable=False, index=True)
+    duration = Column(Integer, nullable=False)
+    max_people = Column(Integer, nullable=False)
+    available_places = Column(Integer, nullable=False)
+    occupied_places = Column(Integer, nullable=False)
+    price_per_person = Column(Integer, nullable=False)
+    image_path = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
+    archived_at = Column(String, nullable=False)
+
+    users = relationship("UserArchiveTable", back_populates="tour")
+
+
+class UserArchiveTable(Base):
+    """
+        Модель таблицы 'users_archive' для хранения бронирований прошедших туров.
+
+        Атрибуты совпадают с UserTable, дополнительно:
+            archive_id (int): Уникальный идентификатор записи архива.
+            tour_archive_id (int): Идентификатор архивной записи тура.
+
+        Связи:
+            tour (relationship): Связь с моделью TourArchiveTable.
+        """
+    __tablename__ = 'users_archive'
+
+    archive_id = Column(Integer, primary_key=True)
+    id = Column(Integer, nullable=False)
+    name = Column(String)
+    email = Column(String)
+    phone = Column(Integer)
+    number_of_people = Column(Integer)
+    tour_id = Column(Integer)
+    tour_archive_id = Column(Integer, ForeignKey('tours_archive.archive_id'), index=True)
+
+    tour = relationship("TourArchiveTable", back_populates="users")
+
+
+def archive_past_tours(today=None, batch_size=100):
+    """
+        Переносит прошедшие туры и их бронирования в архивные таблицы.
+
+        Каждая пачка туров переносится в отдельной транзакции, чтобы не держать блокировку
+        записи SQLite на все время архивации.
+
+        Аргументы:
+            today (str): Дата в формате ГГГГ-ММ-ДД; туры, начавшиеся раньше нее, архивируются.
+            batch_size (int): Количество туров в одной транзакции.
+
+        Возвращает:
+            int: Количество перенесенных туров.
+        """
+    today = today or date.today().isoformat()
+    tour_columns = [column.name for column in TourTable.__table__.columns]
+    user_columns = [column.name for column in UserTable.__table__.columns]
+    archived = 0
+
+    while True:
+        with SessionLocal() as sessionloc:
+            ids = sessionloc.execute(
+                select(TourTable.id).where(TourTable.start_date_tour < today).order_by(TourTable.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+
+            archived_at = datetime.now().isoformat(timespec='seconds')
+            last_archive_id = sessionloc.execute(
+                select(func.coalesce(func.max(TourArchiveTable.archive_id), 0))).scalar()
+            sessionloc.execute(insert(TourArchiveTable).from_select(
+                tour_columns + ['archived_at'],
+                select(*[getattr(TourTable, name) for name in tour_columns], literal(archived_at))
+                .where(TourTable.id.in_(ids))))
+            sessionloc.execute(insert(UserArchiveTable).from_select(
+                user_columns + ['tour_archive_id'],
+                select(*[getattr(UserTable, name) for name in user_columns], TourArchiveTable.archive_id)
+                .join(TourArchiveTable, (TourArchiveTable.id == UserTable.tour_id)
+                      & (TourArchiveTable.archive_id > last_archive_id))
+                .where(UserTable.tour_id.in_(ids))))
+            sessionloc.execute(delete(UserTable).where(UserTable.tour_id.in_(ids)))
+            sessionloc.execute(delete(TourStatsTable).where(TourStatsTable.tour_id.in_(ids)))
+            sessionloc.execute(delete(TourTable).where(TourTable.id.in_(ids)))
+            cancel_notifications(sessionloc, tour_ids=ids)
+            sessionloc.commit()
+
+        archived += len(ids)
+        logger.info('В архив перенесено туров: %d', len(ids))
+
+    return archived
+
+
+class NotificationTable(Base):
+    """
+        Модель таблицы 'notifications' - очередь писем клиентам с состоянием доставки.
+
+        Уникальный ключ key не дает поставить одно и то же уведомление в очередь повторно.
+
+        Атрибуты:
+            id (int): Уникальный идентификатор уведомления.
+            key (str): Ключ дедупликации (вид, клиент, тур, дата).
+            kind (str): Вид уведомления: 'reminder' или 'date_change'.
+            user_id (int): Идентификатор клиента.
+            tour_id (int): Идентификатор тура.
+            email (str): Адрес получателя.
+            subject (str): Тема письма.
+            body (str): Текст письма.
+            status (str): Состояние: 'pending', 'sending', 'sent', 'failed' или 'cancelled'.
+            attempts (int): Количество попыток отправки.
+            claim (str): Идентификатор запуска рассылки, захватившего уведомление.
+            claimed_at (str): Дата и время захвата уведомления для отправки.
+            created_at (str): Дата и время постановки в очередь.
+            sent_at (str): Дата и время отправки.
+        """
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        Index('ix_notifications_status_id', 'status', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String, nullable=False, unique=True)
+    kind = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    tour_id = Column(Integer, nullable=False)
+    email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    claim = Column(String)
+    claimed_at = Column(String)
+    created_at = Column(String, nullable=False)
+    sent_at = Column(String)
+
+
+def cancel_notifications(sessionloc, user_ids=None, tour_ids=None):
+    """
+        Отменяет неотправленные уведомления удаленных бронирований в текущей транзакции.
+
+        Аргументы:
+            sessionloc (Session): Сессия, в транзакции которой удаляются бронирования.
+            user_ids (list): Идентификаторы удаленных клиентов.
+            tour_ids (list): Идентификаторы удаленных или архивированных туров.
+        """
+    conditions = []
+    if user_ids:
+        conditions.append(NotificationTable.user_id.in_([int(user_id) for user_id in user_ids]))
+    if tour_ids:
+        conditions.append(NotificationTable.tour_id.in_([int(tour_id) for tour_id in tour_ids]))
+    if conditions:
+        sessionloc.execute(update(NotificationTable)
+                           .where(NotificationTable.status == 'pending', or_(*conditions))
+                           .values(status='cancelled'))
+
+
+class TourStatsTable(Base):
+    """
+        Модель таблицы 'tour_stats' со сводными данными по бронированиям тура.
+
+        Строки обновляются инкрементально в тех же транзакциях, что и бронирования и удаления,
+        поэтому панель статистики не сканирует таблицу users.
+
+        Атрибуты:
+            tour_id (int): Идентификатор тура.
+            bookings (int): Количество бронирований.
+            people (int): Суммарное количество забронированных мест.
+        """
+    __tablename__ = 'tour_stats'
+
+    tour_id = Column(Integer, ForeignKey('tours.id'), primary_key=True)
+    bookings = Column(Integer, nullable=False, default=0)
+    people = Column(Integer, nullable=False, default=0)
+
+
+def record_booking(sessionloc, tour_id, number_of_people, sign=1):
+    """
+        Учитывает бронирование (или его отмену при sign=-1) в сводной таблице в текущей транзакции.
+
+        Аргументы:
+            sessionloc (Session): Сессия, в транзакции которой выполняется изменение.
+            tour_id (int): Идентификатор тура.
+            number_of_people (int): Количество мест в бронировании.
+            sign (int): 1 для бронирования, -1 для отмены.
+        """
+    tour_id, number_of_people = int(tour_id), int(number_of_people)
+    query = (update(TourStatsTable)
+             .where(TourStatsTable.tour_id == tour_id)
+             .values(bookings=TourStatsTable.bookings + sign,
+                     people=TourStatsTable.people + sign * number_of_people))
+    if sessionloc.execute(query).rowcount == 0 and sign > 0:
+        sessionloc.add(TourStatsTable(tour_id=tour_id, bookings=1, people=number_of_people))
+
+
+def drop_tour_stats(sessionloc, tour_id):
+    """
+        Удаляет сводные данные тура в текущей транзакции (при удалении тура).
+        """
+    sessionloc.execute(delete(TourStatsTable).where(TourStatsTable.tour_id == int(tour_id)))
+
+
+def rebuild_stats(sessionloc):
+    """
+        Пересчитывает сводную таблицу по таблице users и сообщает о расхождениях.
+
+        Аргументы:
+            sessionloc (Session): Сессия для записи.
+
+        Возвращает:
+            list: Идентификаторы туров, для которых сводные данные расходились с фактическими.
+        """
+    actual = {
+        tour_id: (bookings, people)
+        for tour_id, bookings, people in sessionloc.execute(
+            select(UserTable.tour_id, func.count(UserTable.id), func.coalesce(func.sum(UserTable.number_of_people), 0))
+            .join(TourTable, TourTable.id == UserTable.tour_id)
+            .group_by(UserTable.tour_id))
+    }
+    stored = {
+        row.tour_id: (row.bookings, row.people)
+        for row in sessionloc.execute(select(TourStatsTable)).scalars()
+    }
+    mismatched = sorted(tour_id for tour_id in actual.keys() | stored.keys()
+                        if actual.get(tour_id, (0, 0)) != stored.get(tour_id, (0, 0)))
+
+    sessionloc.execute(delete(TourStatsTable))
+    sessionloc.add_all(TourStatsTable(tour_id=tour_id, bookings=bookings, people=people)
+                       for tour_id, (bookings, people) in actual.items())
+    sessionloc.commit()
+    logger.info('Сводная таблица пересчитана, расхождений: %d', len(mismatched))
+    return mismatched
+
+
 class SchemaTour(BaseModel):
     """
        Схема для валидации данных тура с использованием Pydantic.
@@ -159,6 +502,31 @@ class User(SchemaUser):
     id: int
 
 
+def _add_missing_columns():
+    """
+        Добавляет в существующие таблицы столбцы и индексы, появившиеся в моделях после их создания.
+        """
+    columns = {column['name'] for column in inspect(engine).get_columns('tours')}
+    if 'version' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE tours ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+        logger.info('В таблицу tours добавлен столбец version.')
+
+    # create_all не создает индексы для уже существующих таблиц
+    for table in (TourTable.__table__, UserTable.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _fill_stats():
+    """
+        Заполняет сводную таблицу при первом создании, если в базе уже есть бронирования.
+        """
+    with SessionLocal() as sessionloc:
+        if sessionloc.execute(select(TourStatsTable.tour_id).limit(1)).first() is None:
+            rebuild_stats(sessionloc)
+
+
 def create_tables():
     """
         Создает таблицы в базе данных на основе определенных моделей.
@@ -167,6 +535,8 @@ def create_tables():
         """
     try:
         Base.metadata.create_all(bind=engine)
+        _add_missing_columns()
+        _fill_stats()
         logger.info('Таблицы успешно созданы в базе данных.')
     except Exception as e:
         logger.error('Ошибка при создании таблиц: %s', str(e))
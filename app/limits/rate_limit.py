@@ -0,0 +1,274 @@
+"""
+Данный файл реализует контроль допуска для записывающих маршрутов: ограничение частоты запросов
+по алгоритму token bucket (для каждого клиента и глобально) и ограничение числа одновременных писателей.
+При перегрузке запрос сразу получает ответ 429/503 с заголовком Retry-After вместо ожидания
+блокировки записи SQLite.
+"""
+
+import math
+import time
+import sqlite3
+import threading
+import logging.config
+from functools import wraps
+from collections import namedtuple
+from flask import request, Response
+from log_set.log_setting import LOGGING
+
+# Настройка логирования
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('log')
+
+# Параметры корзины токенов для одного клиента: скорость пополнения (токенов/сек) и емкость
+CLIENT_RATE = 1.0
+CLIENT_CAPACITY = 5
+
+# Параметры глобальной корзины токенов для всех клиентов
+GLOBAL_RATE = 20.0
+GLOBAL_CAPACITY = 40
+
+# Максимальное количество одновременно выполняемых записывающих запросов
+MAX_CONCURRENT_WRITERS = 4
+
+# Время жизни слота писателя в общем хранилище (на случай падения воркера), секунд
+WRITER_LEASE_TTL = 30
+
+# Как часто удаляются корзины, пополнившиеся до емкости, секунд
+SWEEP_INTERVAL = 60
+
+# Ожидание блокировки общего хранилища, секунд; при превышении запрос отклоняется с 503
+STORAGE_TIMEOUT = 0.5
+
+# HTTP-методы, на которые распространяется контроль допуска
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# Ключ глобальной корзины
+GLOBAL_KEY = 'global'
+
+# Решение о допуске: status - код отказа (None, если запрос допущен), retry_after - секунд до повтора,
+# reason - причина отказа для журнала, slot - идентификатор занятого слота писателя
+Decision = namedtuple('Decision', ['status', 'retry_after', 'reason', 'slot'])
+
+
+def _admit(buckets, client_key, writers, max_writers, now):
+    """
+        Принимает решение о допуске по состоянию корзин, не изменяя его.
+
+        Корзина клиента проверяется первой: клиент, исчерпавший свой лимит, не расходует глобальную
+        корзину и не мешает остальным клиентам. Токены списываются только у допущенного запроса.
+
+        Аргументы:
+            buckets (dict): Состояние корзин {ключ: (токены, время обновления)}; отсутствующая корзина полна.
+            client_key (str): Ключ корзины клиента.
+            writers (int): Количество занятых слотов писателей.
+            max_writers (int): Максимальное количество слотов писателей.
+            now (float): Текущее время.
+
+        Возвращает:
+            tuple: Решение (Decision без slot) и новое состояние корзин
+                   {ключ: (токены, время обновления, время полного пополнения)} для допущенного запроса.
+        """
+    updates = {}
+    for key, rate, capacity, reason in ((client_key, CLIENT_RATE, CLIENT_CAPACITY, 'лимит клиента'),
+                                        (GLOBAL_KEY, GLOBAL_RATE, GLOBAL_CAPACITY, 'глобальный лимит')):
+        tokens, updated = buckets.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        if tokens < 1:
+            return Decision(429, (1 - tokens) / rate, reason, None), {}
+        updates[key] = (tokens - 1, now, now + (capacity - tokens + 1) / rate)
+
+    if writers >= max_writers:
+        return Decision(503, 1, 'превышено число одновременных писателей', None), {}
+    return Decision(None, 0, None, None), updates
+
+
+class MemoryBackend:
+    """
+        Хранилище корзин токенов и слотов писателей в памяти процесса (по умолчанию).
+
+        Подходит для одного процесса; для нескольких воркеров используйте общее хранилище,
+        например SQLiteBackend.
+        """
+
+    def __init__(self, max_writers=MAX_CONCURRENT_WRITERS):
+        self.max_writers = max_writers
+        self._buckets = {}
+        self._writers = 0
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def admit(self, client_key):
+        """
+            Проверяет корзину клиента, глобальную корзину и слоты писателей и при допуске
+            атомарно списывает токены и занимает слот.
+
+            Аргументы:
+                client_key (str): Ключ корзины клиента.
+
+            Возвращает:
+                Decision: Решение о допуске.
+            """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept > SWEEP_INTERVAL:
+                # Пополнившаяся корзина не отличается от отсутствующей, поэтому ее можно удалить
+                self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+                self._swept = now
+
+            buckets = {key: self._buckets[key][:2] for key in (client_key, GLOBAL_KEY) if key in self._buckets}
+            decision, updates = _admit(buckets, client_key, self._writers, self.max_writers, now)
+            if decision.status:
+                return decision
+            self._buckets.update(updates)
+            self._writers += 1
+        return decision._replace(slot=True)
+
+    def release_writer(self, slot):
+        with self._lock:
+            self._writers -= 1
+
+
+class SQLiteBackend:
+    """
+        Общее хранилище корзин токенов и слотов писателей в отдельном файле SQLite
+        для нескольких воркеров.
+
+        Допуск запроса и освобождение слота выполняются каждый в одной транзакции; соединения
+        переиспользуются в пределах потока. Если хранилище заблокировано дольше STORAGE_TIMEOUT,
+        запрос отклоняется с 503, а не пропускается без проверки.
+
+        Аргументы:
+            path (str): Путь к файлу базы данных с корзинами.
+            max_writers (int): Максимальное количество одновременных писателей во всех воркерах.
+        """
+
+    def __init__(self, path, max_writers=MAX_CONCURRENT_WRITERS):
+        self.path = path
+        self.max_writers = max_writers
+        self._local = threading.local()
+        self._swept = time.time()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                     'updated REAL NOT NULL, full_at REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)')
+        conn.execute('CREATE TABLE IF NOT EXISTS writers (id INTEGER PRIMARY KEY, expires REAL NOT NULL)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=STORAGE_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def admit(self, client_key):
+        """
+            Принимает решение о допуске (см. MemoryBackend.admit) в одной транзакции.
+
+            Просроченные слоты (воркер упал, не освободив слот) удаляются.
+            """
+        now = time.time()
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if now - self._swept > SWEEP_INTERVAL:
+                    conn.execute('DELETE FROM buckets WHERE full_at <= ?', (now,))
+                    self._swept = now
+                conn.execute('DELETE FROM writers WHERE expires < ?', (now,))
+                writers = conn.execute('SELECT COUNT(*) FROM writers').fetchone()[0]
+                rows = conn.execute('SELECT key, tokens, updated FROM buckets WHERE key IN (?, ?)',
+                                    (client_key, GLOBAL_KEY)).fetchall()
+                decision, updates = _admit({key: (tokens, updated) for key, tokens, updated in rows},
+                                           client_key, writers, self.max_writers, now)
+                if not decision.status:
+                    conn.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) '
+                                     'VALUES (?, ?, ?, ?)', [(key, *bucket) for key, bucket in updates.items()])
+                    slot = conn.execute('INSERT INTO writers (expires) VALUES (?)',
+                                        (now + WRITER_LEASE_TTL,)).lastrowid
+                    decision = decision._replace(slot=slot)
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+            return decision
+        except sqlite3.Error as e:
+            # Недоступность или блокировка хранилища - это перегрузка, а не повод пропустить запрос
+            logger.error('Ошибка хранилища ограничения частоты: %s', str(e))
+            return Decision(503, 1, 'хранилище ограничения частоты недоступно', None)
+
+    def release_writer(self, slot):
+        try:
+            self._connection().execute('DELETE FROM writers WHERE id = ?', (slot,))
+        except sqlite3.Error as e:
+            # Слот освободится сам по истечении WRITER_LEASE_TTL
+            logger.error('Ошибка хранилища ограничения частоты: %s', str(e))
+
+
+# Текущее хранилище корзин и слотов писателей
+backend = MemoryBackend()
+
+
+def set_backend(new_backend):
+    """
+        Устанавливает хранилище корзин токенов (например, общее для нескольких воркеров).
+
+        Аргументы:
+            new_backend: Объект с методами admit и release_writer.
+        """
+    global backend
+    backend = new_backend
+
+
+def setup_rate_limit(app):
+    """
+        Выбирает хранилище контроля допуска по app.config['RATE_LIMIT_STORAGE'].
+
+        Значение None или 'memory' - хранилище в памяти процесса, путь к файлу - общее хранилище
+        SQLiteBackend для нескольких воркеров.
+
+        Аргументы:
+            app: Экземпляр приложения Flask.
+        """
+    storage = app.config.setdefault('RATE_LIMIT_STORAGE', None)
+    if storage and storage != 'memory':
+        set_backend(SQLiteBackend(storage))
+        logger.info('Контроль допуска использует общее хранилище %s', storage)
+    else:
+        set_backend(MemoryBackend())
+
+
+def _reject(status, retry_after, reason):
+    """
+        Формирует быстрый отказ с заголовком Retry-After.
+        """
+    retry_after = max(1, math.ceil(retry_after))
+    logger.warning('Запрос %s %s отклонен (%s), Retry-After: %d', request.method, request.path,
+                   reason, retry_after)
+    return Response('Сервер перегружен, повторите попытку позже.', status=status,
+                    headers={'Retry-After': str(retry_after)}, mimetype='text/plain')
+
+
+def admission_control(view):
+    """
+        Декоратор представления, применяющий контроль допуска к записывающим запросам.
+
+        Возвращает 429, если исчерпана корзина клиента или глобальная корзина, и 503,
+        если достигнут предел одновременных писателей. Запросы на чтение пропускаются без проверок.
+        Клиент определяется по request.remote_addr, поэтому за прокси должен быть включен ProxyFix.
+        """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method not in WRITE_METHODS:
+            return view(*args, **kwargs)
+
+        decision = backend.admit(f'client:{request.remote_addr}')
+        if decision.status:
+            return _reject(decision.status, decision.retry_after, decision.reason)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            backend.release_writer(decision.slot)
+
+    return wrapper
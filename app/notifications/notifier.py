@@ -0,0 +1,236 @@
+"""
+Данный файл реализует рассылку уведомлений клиентам: напоминания за N дней до начала тура и
+сообщения об изменении даты тура. Уведомления ставятся в очередь (таблица notifications) без
+дубликатов и отправляются пачками через одно SMTP-соединение с ограничением скорости.
+"""
+
+import time
+import uuid
+import logging.config
+from datetime import date, datetime, timedelta
+from flask_mail import Message
+from sqlalchemy import select, insert, update, or_, and_
+from sqlalchemy.dialects import sqlite, postgresql
+from database.db import SessionLocal, SessionRead, TourTable, UserTable, NotificationTable
+from log_set.log_setting import LOGGING
+
+# Настройка логирования
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('log')
+
+# За сколько дней до начала тура отправляется напоминание
+REMINDER_DAYS = 3
+
+# Количество писем, отправляемых через одно SMTP-соединение
+BATCH_SIZE = 50
+
+# Максимальная скорость отправки (писем в секунду) согласно лимитам почтового провайдера
+RATE_LIMIT = 5.0
+
+# После стольких неудачных попыток уведомление помечается как 'failed'
+MAX_ATTEMPTS = 3
+
+# Количество строк, читаемых из базы за один раз при постановке в очередь
+STREAM_CHUNK = 500
+
+# Через сколько секунд захваченные, но не отправленные уведомления (рассылка прервалась)
+# снова становятся доступны для отправки
+CLAIM_TIMEOUT = 900
+
+# Конструкторы INSERT с поддержкой ON CONFLICT DO NOTHING для диалектов баз данных
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _enqueue(sessionloc, rows):
+    """
+        Добавляет уведомления в очередь, пропуская уже существующие (по ключу key).
+
+        Для SQLite и PostgreSQL используется ON CONFLICT DO NOTHING, для остальных баз
+        существующие ключи отбрасываются предварительной выборкой.
+        """
+    if not rows:
+        return
+    make_insert = UPSERT_INSERTS.get(sessionloc.get_bind().dialect.name)
+    if make_insert:
+        sessionloc.execute(make_insert(NotificationTable).on_conflict_do_nothing(index_elements=['key']), rows)
+        return
+    existing = set(sessionloc.execute(
+        select(NotificationTable.key).where(NotificationTable.key.in_([row['key'] for row in rows]))).scalars())
+    rows = [row for row in rows if row['key'] not in existing]
+    if rows:
+        sessionloc.execute(insert(NotificationTable), rows)
+
+
+def enqueue_reminders(days=REMINDER_DAYS, today=None):
+    """
+        Ставит в очередь напоминания клиентам туров, начинающихся в ближайшие days дней.
+
+        Выбираются все туры окна (today, today + days], поэтому пропущенный запуск не теряет
+        напоминания; повторная постановка исключается ключом дедупликации.
+        Клиенты читаются потоком по индексам tours.start_date_tour и users.tour_id.
+
+        Аргументы:
+            days (int): За сколько дней до начала тура напоминать.
+            today (date): Текущая дата (по умолчанию - сегодня).
+
+        Возвращает:
+            int: Количество просмотренных бронирований.
+        """
+    today = today or date.today()
+    last_date = (today + timedelta(days=days)).isoformat()
+    query = (select(UserTable.id, UserTable.email, UserTable.number_of_people, TourTable.id, TourTable.title,
+                    TourTable.start_date_tour, TourTable.duration)
+             .join(TourTable, TourTable.id == UserTable.tour_id)
+             .where(TourTable.start_date_tour > today.isoformat(), TourTable.start_date_tour <= last_date))
+    processed = 0
+    # Чтение идет через пул только для чтения, запись очереди - отдельной сессией по частям
+    with SessionRead() as readloc, SessionLocal() as sessionloc:
+        result = readloc.execute(query.execution_options(yield_per=STREAM_CHUNK))
+        for chunk in result.partitions():
+            _enqueue(sessionloc, [
+                {
+                    'key': f'reminder:{user_id}:{tour_id}:{start_date_tour}',
+                    'kind': 'reminder',
+                    'user_id': user_id,
+                    'tour_id': tour_id,
+                    'email': email,
+                    'subject': 'Tours for the soul. Напоминание о туре',
+                    'body': (f'\nНапоминаем, что через {(date.fromisoformat(start_date_tour) - today).days} дн. '
+                             f'начинается Ваш тур: {title}\n'
+                             f'Дата старта тура: {start_date_tour}\n'
+                             f'Длительность тура: {duration} дн.\n'
+                             f'Количество людей: {number_of_people}\n'
+                             f'Ждем Вас!'),
+                    'created_at': _now(),
+                }
+                for user_id, email, number_of_people, tour_id, title, start_date_tour, duration in chunk
+            ])
+            sessionloc.commit()
+            processed += len(chunk)
+
+    logger.info('Напоминания о турах до %s: обработано бронирований %d', last_date, processed)
+    return processed
+
+
+def enqueue_date_change(sessionloc, tour_id, title, old_date, new_date):
+    """
+        Ставит в очередь уведомления об изменении даты тура и отменяет ожидающие напоминания
+        о нем в текущей транзакции.
+
+        Аргументы:
+            sessionloc (Session): Сессия, в транзакции которой изменяется тур.
+            tour_id (int): Идентификатор тура.
+            title (str): Название тура.
+            old_date (str): Прежняя дата начала тура.
+            new_date (str): Новая дата начала тура.
+        """
+    # Напоминания со старой датой (например, ожидающие повторной отправки) больше не актуальны
+    sessionloc.execute(update(NotificationTable)
+                       .where(NotificationTable.tour_id == int(tour_id), NotificationTable.kind == 'reminder',
+                              NotificationTable.status == 'pending')
+                       .values(status='cancelled'))
+
+    query = select(UserTable.id, UserTable.email).where(UserTable.tour_id == tour_id)
+    rows = [
+        {
+            'key': f'date_change:{user_id}:{tour_id}:{new_date}',
+            'kind': 'date_change',
+            'user_id': user_id,
+            'tour_id': int(tour_id),
+            'email': email,
+            'subject': 'Tours for the soul. Изменение даты тура',
+            'body': (f'\nДата начала Вашего тура "{title}" изменена.\n'
+                     f'Прежняя дата: {old_date}\n'
+                     f'Новая дата: {new_date}\n'
+                     f'Если новая дата Вам не подходит, пожалуйста, свяжитесь с нашим менеджером.'),
+            'created_at': _now(),
+        }
+        for user_id, email in sessionloc.execute(query)
+    ]
+    _enqueue(sessionloc, rows)
+    logger.info('Уведомления об изменении даты тура %s поставлены в очередь: %d', tour_id, len(rows))
+
+
+def send_pending(mail, batch_size=BATCH_SIZE, rate=RATE_LIMIT):
+    """
+        Отправляет уведомления из очереди пачками через одно SMTP-соединение на пачку.
+
+        Перед отправкой пачка захватывается одним UPDATE (статус 'sending' и идентификатор запуска),
+        поэтому одновременные запуски не отправят одно уведомление дважды. Состояние каждого письма
+        фиксируется сразу после отправки, поэтому повторный запуск не отправит его снова.
+
+        Аргументы:
+            mail (Mail): Расширение Flask-Mail.
+            batch_size (int): Количество писем на одно соединение.
+            rate (float): Максимальное количество писем в секунду.
+
+        Возвращает:
+            tuple: Количество отправленных и неудачных писем.
+        """
+    sent = failed = 0
+    interval = 1 / rate if rate else 0
+    last_id = 0
+    claim = uuid.uuid4().hex
+
+    while True:
+        with SessionLocal() as sessionloc:
+            stale = (datetime.now() - timedelta(seconds=CLAIM_TIMEOUT)).isoformat(timespec='seconds')
+            claimable = and_(NotificationTable.id > last_id,
+                             or_(NotificationTable.status == 'pending',
+                                 and_(NotificationTable.status == 'sending', NotificationTable.claimed_at < stale)))
+            ids = (select(NotificationTable.id).where(claimable)
+                   .order_by(NotificationTable.id).limit(batch_size).scalar_subquery())
+            sessionloc.execute(update(NotificationTable)
+                               .where(NotificationTable.id.in_(ids), claimable)
+                               .values(status='sending', claim=claim, claimed_at=_now()))
+            sessionloc.commit()
+
+            query = (select(NotificationTable.id, NotificationTable.email, NotificationTable.subject,
+                            NotificationTable.body, NotificationTable.attempts)
+                     .where(NotificationTable.claim == claim, NotificationTable.status == 'sending')
+                     .order_by(NotificationTable.id))
+            batch = sessionloc.execute(query).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            try:
+                with mail.connect() as conn:
+                    for notification in batch:
+                        started = time.monotonic()
+                        try:
+                            conn.send(Message(notification.subject, recipients=[notification.email],
+                                              body=notification.body))
+                            values = {'status': 'sent', 'sent_at': _now(), 'attempts': notification.attempts + 1}
+                            sent += 1
+                        except Exception as e:
+                            attempts = notification.attempts + 1
+                            values = {'status': 'failed' if attempts >= MAX_ATTEMPTS else 'pending',
+                                      'attempts': attempts}
+                            failed += 1
+                            logger.error('Ошибка при отправке уведомления %s на адрес %s: %s',
+                                         notification.id, notification.email, str(e))
+                        sessionloc.execute(update(NotificationTable)
+                                           .where(NotificationTable.id == notification.id).values(**values))
+                        sessionloc.commit()
+
+                        # Ограничение скорости отправки
+                        pause = interval - (time.monotonic() - started)
+                        if pause > 0:
+                            time.sleep(pause)
+            except Exception as e:
+                logger.error('Ошибка SMTP-соединения при рассылке уведомлений: %s', str(e))
+                # Неотправленные письма пачки возвращаются в очередь
+                sessionloc.rollback()
+                sessionloc.execute(update(NotificationTable)
+                                   .where(NotificationTable.claim == claim, NotificationTable.status == 'sending')
+                                   .values(status='pending'))
+                sessionloc.commit()
+                break
+
+    logger.info('Рассылка уведомлений завершена: отправлено %d, ошибок %d', sent, failed)
+    return sent, failed
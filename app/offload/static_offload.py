@@ -0,0 +1,71 @@
+"""
+Данный файл реализует передачу отдачи статических файлов (стилей и изображений туров) фронтенд-прокси.
+Приложение только проверяет путь и отвечает заголовком X-Accel-Redirect (nginx) или X-Sendfile
+(Apache, lighttpd и др.), а сами байты прокси отправляет через sendfile, не занимая Python-воркер.
+"""
+
+import os
+import mimetypes
+from urllib.parse import quote
+import logging.config
+from flask import Response, abort
+from werkzeug.security import safe_join
+from log_set.log_setting import LOGGING
+
+# Настройка логирования
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('log')
+
+# Значения по умолчанию, переопределяются через app.config
+DEFAULTS = {
+    # Режим отдачи статики: None (Flask), 'x-sendfile' или 'x-accel'
+    'STATIC_OFFLOAD': None,
+    # Префикс internal-location nginx, соответствующий каталогу static
+    'STATIC_ACCEL_PREFIX': '/_static/',
+    # Время кэширования статики браузером, секунд
+    'STATIC_MAX_AGE': 86400,
+}
+
+
+def setup_static_offload(app):
+    """
+        Настраивает отдачу статических файлов через фронтенд-прокси.
+
+        Аргументы:
+            app: Экземпляр приложения Flask.
+        """
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    mode = app.config['STATIC_OFFLOAD']
+    if not mode:
+        return
+    if mode not in ('x-accel', 'x-sendfile'):
+        raise ValueError(f'Неизвестный режим отдачи статики: {mode}')
+
+    prefix = app.config['STATIC_ACCEL_PREFIX'].rstrip('/') + '/'
+    max_age = app.config['STATIC_MAX_AGE']
+
+    def static_offload(filename):
+        """
+            Проверяет путь к статическому файлу и поручает его отдачу прокси.
+
+            Путь в заголовке экранируется (%XX), так как имена изображений туров содержат кириллицу;
+            nginx и mod_xsendfile раскодируют его.
+            """
+        path = safe_join(app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        if mode == 'x-accel':
+            relative = os.path.relpath(path, app.static_folder).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = quote(prefix + relative)
+        else:
+            response.headers['X-Sendfile'] = quote(os.path.abspath(path))
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response
+
+    app.view_functions['static'] = static_offload
+    logger.info('Статика отдается через прокси в режиме %s.', mode)
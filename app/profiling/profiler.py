@@ -0,0 +1,186 @@
+"""
+Данный файл реализует выборочное профилирование запросов: часть запросов (или запросы с заголовком
+администратора) выполняется под сэмплирующим профилировщиком, а результат сохраняется в формате
+collapsed stacks (.folded), который открывают flamegraph.pl и speedscope.
+"""
+
+import os
+import sys
+import hmac
+import time
+import random
+import threading
+import logging.config
+from collections import Counter
+from datetime import datetime
+from flask import g, request
+from log_set.log_setting import LOGGING
+
+# Настройка логирования
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('log')
+
+# Заголовок, которым администратор запрашивает профилирование конкретного запроса
+PROFILE_HEADER = 'X-Profile'
+
+# Значения по умолчанию, переопределяются через app.config
+DEFAULTS = {
+    'PROFILE_SAMPLE_RATE': 0.0,
+    'PROFILE_INTERVAL': 0.005,
+    'PROFILE_TOKEN': None,
+    'PROFILE_MAX_PER_ENDPOINT': 20,
+    'PROFILE_DIR': os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'profiles'),
+}
+
+
+class Sampler:
+    """
+        Сэмплирующий профилировщик одного потока: с заданным интервалом снимает стек потока
+        и подсчитывает одинаковые стеки.
+
+        Аргументы:
+            thread_id (int): Идентификатор профилируемого потока.
+            interval (float): Интервал между снимками в секундах.
+        """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """
+            Возвращает результат в формате collapsed stacks: 'кадр;кадр;кадр количество' в каждой строке.
+            """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _should_profile(config):
+    """
+        Решает, профилировать ли текущий запрос.
+        """
+    token = config['PROFILE_TOKEN']
+    header = request.headers.get(PROFILE_HEADER)
+    # Сравнение за постоянное время, чтобы токен нельзя было подобрать по времени ответа
+    if token and header and hmac.compare_digest(header.encode(), token.encode()):
+        return True
+    rate = config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _prune(endpoint_dir, keep):
+    """
+        Удаляет самые старые профили эндпоинта, оставляя не более keep файлов.
+
+        Имена профилей начинаются с метки времени, поэтому порядок имен совпадает с порядком создания.
+        """
+    names = sorted(os.listdir(endpoint_dir))
+    for name in names[:max(0, len(names) - keep)]:
+        try:
+            os.remove(os.path.join(endpoint_dir, name))
+        except OSError as e:
+            logger.error('Ошибка при удалении старого профиля %s: %s', name, str(e))
+
+
+def list_profiles(profile_dir, limit=200):
+    """
+        Возвращает список сохраненных профилей, новые сначала.
+
+        Профили упорядочиваются по метке времени в имени файла, поэтому размер и время
+        запрашиваются только для попавших в список.
+
+        Аргументы:
+            profile_dir (str): Каталог с профилями.
+            limit (int): Максимальное количество профилей в списке.
+
+        Возвращает:
+            list: Словари с ключами endpoint, name, path, size, created.
+        """
+    if not os.path.isdir(profile_dir):
+        return []
+
+    entries = []
+    for endpoint in os.listdir(profile_dir):
+        endpoint_dir = os.path.join(profile_dir, endpoint)
+        if os.path.isdir(endpoint_dir):
+            entries.extend((name, endpoint) for name in sorted(os.listdir(endpoint_dir))[-limit:])
+    entries.sort(reverse=True)
+
+    profiles = []
+    for name, endpoint in entries[:limit]:
+        try:
+            stat = os.stat(os.path.join(profile_dir, endpoint, name))
+        except OSError:
+            # Профиль мог быть удален при очистке между listdir и stat
+            continue
+        profiles.append({
+            'endpoint': endpoint,
+            'name': name,
+            'path': f'{endpoint}/{name}',
+            'size': stat.st_size,
+            'created': datetime.fromtimestamp(stat.st_mtime),
+        })
+    return profiles
+
+
+def setup_profiler(app):
+    """
+        Настраивает выборочное профилирование запросов для приложения Flask.
+
+        При PROFILE_SAMPLE_RATE = 0 и без заголовка X-Profile накладные расходы сводятся
+        к одной проверке в before_request. Для каждого эндпоинта хранится не более
+        PROFILE_MAX_PER_ENDPOINT последних профилей.
+
+        Аргументы:
+            app: Экземпляр приложения Flask.
+        """
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    @app.before_request
+    def start_profiler():
+        if _should_profile(app.config):
+            g.profiler = Sampler(threading.get_ident(), app.config['PROFILE_INTERVAL'])
+            g.profiler.start()
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        sampler = g.pop('profiler', None)
+        if sampler is None:
+            return
+
+        duration = sampler.stop()
+        endpoint = request.endpoint or 'unknown'
+        endpoint_dir = os.path.join(app.config['PROFILE_DIR'], endpoint)
+        name = f'{datetime.now():%Y%m%d-%H%M%S-%f}-{int(duration * 1000)}ms.folded'
+        try:
+            os.makedirs(endpoint_dir, exist_ok=True)
+            with open(os.path.join(endpoint_dir, name), 'w', encoding='utf-8') as file:
+                file.write(sampler.collapsed())
+            logger.info('Профиль запроса %s сохранен: %s/%s', request.path, endpoint, name)
+            _prune(endpoint_dir, app.config['PROFILE_MAX_PER_ENDPOINT'])
+        except OSError as e:
+            logger.error('Ошибка при сохранении профиля: %s', str(e))
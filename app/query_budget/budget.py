@@ -0,0 +1,69 @@
+"""
+Данный файл описывает бюджеты SQL-запросов для маршрутов приложения и счетчик запросов, подключаемый
+к событиям движков SQLAlchemy. Сама проверка (поиск N+1 запросов на небольшой и на большой базе)
+выполняется тестами tests/test_query_budgets.py.
+"""
+
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Бюджет маршрута: максимальное число запросов и допустимый прирост запросов на каждую строку базы
+Budget = namedtuple('Budget', ['max_queries', 'per_row'], defaults=[0])
+
+# Объявленные бюджеты запросов для всех маршрутов приложения (ключ - endpoint и HTTP-метод)
+BUDGETS = {
+    ('welcome_page', 'GET'): Budget(0),
+    ('tours_page', 'GET'): Budget(2),
+    ('current_tour', 'GET'): Budget(2),
+    ('current_tour', 'POST'): Budget(5),
+    ('success_page', 'GET'): Budget(0),
+    ('api_tours', 'GET'): Budget(2),
+    ('api_tour', 'GET'): Budget(2),
+    ('api_availability', 'GET'): Budget(1),
+    ('admin_page', 'GET'): Budget(0),
+    ('admin_page', 'POST'): Budget(0),
+    ('profile_page', 'GET'): Budget(0),
+    ('profile_page', 'POST'): Budget(0),
+    ('clients', 'GET'): Budget(1),
+    ('dashboard', 'GET'): Budget(1),
+    ('archive', 'GET'): Budget(1),
+    ('archive_tour', 'GET'): Budget(2),
+    ('profiles', 'GET'): Budget(0),
+    ('profile_file', 'GET'): Budget(0),
+    ('up_del_tour_page', 'GET'): Budget(1),
+    ('up_del_tour_page', 'POST'): Budget(1),
+    ('update_tour', 'GET'): Budget(1),
+    ('update_tour', 'POST'): Budget(4),
+    ('add_tour_page', 'GET'): Budget(0),
+    ('add_tour_page', 'POST'): Budget(1),
+    ('delete_tour', 'GET'): Budget(0),
+    ('delete_tour', 'POST'): Budget(5),
+    ('delete_user', 'GET'): Budget(0),
+    ('delete_user', 'POST'): Budget(6),
+}
+
+
+class QueryCounter:
+    """
+        Контекстный менеджер, подсчитывающий SQL-запросы всех движков SQLAlchemy.
+
+        Атрибуты:
+            count (int): Количество выполненных запросов.
+            statements (list): Тексты выполненных запросов.
+        """
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, 'before_cursor_execute', self._on_execute)
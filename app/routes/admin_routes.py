@@ -6,10 +6,15 @@ import os
 import re
 import logging.config
 from config import *
-from flask import render_template, session, redirect, url_for, request, abort, flash
-from database.db import SessionLocal, TourTable, UserTable
-from sqlalchemy import select, delete
-from sqlalchemy.orm import joinedload
+from flask import render_template, session, redirect, url_for, request, abort, flash, send_from_directory
+from database.db import (get_session, read_only, record_booking, drop_tour_stats, cancel_notifications, TourTable,
+                         UserTable, TourStatsTable, TourArchiveTable)
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from limits.rate_limit import admission_control
+from profiling.profiler import list_profiles
+from notifications.notifier import enqueue_date_change
 from log_set.log_setting import LOGGING
 
 # Настройка логирования
@@ -83,10 +88,17 @@ def setup_admin_routes(app):
                 return redirect(url_for('up_del_tour_page', username=session['userLogged']))
             elif action == "Клиенты":
                 return redirect(url_for('clients', username=session['userLogged']))
+            elif action == "Статистика":
+                return redirect(url_for('dashboard', username=session['userLogged']))
+            elif action == "Профили":
+                return redirect(url_for('profiles', username=session['userLogged']))
+            elif action == "Архив":
+                return redirect(url_for('archive', username=session['userLogged']))
 
         return render_template('admin/admin_edit_list.html')
 
     @app.route('/clients/<username>')
+    @read_only
     def clients(username):
         """
             Отображает список клиентов.
@@ -101,7 +113,7 @@ def setup_admin_routes(app):
             logger.warning('Неавторизованный доступ к клиентам %s', username)
             abort(401)
 
-        with SessionLocal() as sessionloc:
+        with get_session() as sessionloc:
             query = select(UserTable).options(joinedload(UserTable.tour))
             result = sessionloc.execute(query)
             user_models = result.scalars().all()
@@ -113,7 +125,140 @@ def setup_admin_routes(app):
         logger.info('Отображение списка клиентов для %s', username)
         return render_template('admin/admin_clients_page.html', user_models=user_models)
 
+    @app.route('/dashboard/<username>')
+    @read_only
+    def dashboard(username):
+        """
+            Отображает панель статистики: бронирования, заполняемость и выручку по турам.
+
+            Данные берутся из сводной таблицы tour_stats, поэтому время загрузки не зависит
+            от количества бронирований.
+
+            Аргументы:
+                username (str): Имя пользователя, для которого отображается панель.
+
+            Возвращает:
+                HTML: Шаблон панели статистики.
+            """
+        if 'userLogged' not in session or session['userLogged'] != username:
+            logger.warning('Неавторизованный доступ к статистике %s', username)
+            abort(401)
+
+        with get_session() as sessionloc:
+            bookings = func.coalesce(TourStatsTable.bookings, 0)
+            people = func.coalesce(TourStatsTable.people, 0)
+            query = (select(TourTable.id, TourTable.title, TourTable.max_people, TourTable.occupied_places,
+                            bookings.label('bookings'), people.label('people'),
+                            (people * TourTable.price_per_person).label('revenue'))
+                     .outerjoin(TourStatsTable, TourStatsTable.tour_id == TourTable.id)
+                     .order_by(TourTable.id))
+            stats = sessionloc.execute(query).all()
+
+        totals = {
+            'bookings': sum(row.bookings for row in stats),
+            'people': sum(row.people for row in stats),
+            'revenue': sum(row.revenue for row in stats),
+            'occupied_places': sum(row.occupied_places for row in stats),
+            'max_people': sum(row.max_people for row in stats),
+        }
+        logger.info('Отображение статистики для %s', username)
+        return render_template('admin/admin_dashboard_page.html', stats=stats, totals=totals)
+
+    @app.route('/archive/<username>')
+    @read_only
+    def archive(username):
+        """
+            Отображает список архивных (прошедших) туров с поиском по названию.
+
+            Аргументы:
+                username (str): Имя пользователя, для которого отображается архив.
+
+            Возвращает:
+                HTML: Шаблон со списком архивных туров.
+            """
+        if 'userLogged' not in session or session['userLogged'] != username:
+            logger.warning('Неавторизованный доступ к архиву %s', username)
+            abort(401)
+
+        search = request.args.get('q', '')
+        with get_session() as sessionloc:
+            query = select(TourArchiveTable).order_by(TourArchiveTable.start_date_tour.desc()).limit(500)
+            if search:
+                query = query.where(TourArchiveTable.title.contains(search))
+            tour_models = sessionloc.execute(query).scalars().all()
+
+        logger.info('Отображение архива туров для %s', username)
+        return render_template('admin/admin_archive_page.html', tour_models=tour_models, search=search,
+                               username=username)
+
+    @app.route('/archive/<username>/<archive_id>')
+    @read_only
+    def archive_tour(username, archive_id):
+        """
+            Отображает архивный тур и его бронирования.
+
+            Аргументы:
+                username (str): Имя пользователя.
+                archive_id (str): Идентификатор архивной записи тура.
+
+            Возвращает:
+                HTML: Шаблон с данными архивного тура.
+            """
+        if 'userLogged' not in session or session['userLogged'] != username:
+            logger.warning('Неавторизованный доступ к архивному туру %s', archive_id)
+            abort(401)
+
+        with get_session() as sessionloc:
+            query = (select(TourArchiveTable).options(selectinload(TourArchiveTable.users))
+                     .where(TourArchiveTable.archive_id == archive_id))
+            tour_model = sessionloc.execute(query).scalars().first()
+
+        if not tour_model:
+            logger.warning('Архивный тур %s не найден.', archive_id)
+            abort(404)
+
+        logger.info('Отображение архивного тура %s для %s', archive_id, username)
+        return render_template('admin/admin_archive_tour_page.html', tour_model=tour_model)
+
+    @app.route('/profiles/<username>')
+    def profiles(username):
+        """
+            Отображает список сохраненных профилей запросов.
+
+            Аргументы:
+                username (str): Имя пользователя, для которого отображается список.
+
+            Возвращает:
+                HTML: Шаблон со списком профилей.
+            """
+        if 'userLogged' not in session or session['userLogged'] != username:
+            logger.warning('Неавторизованный доступ к профилям %s', username)
+            abort(401)
+
+        profile_models = list_profiles(app.config['PROFILE_DIR'])
+        logger.info('Отображение списка профилей для %s', username)
+        return render_template('admin/admin_profiles_page.html', profile_models=profile_models, username=username)
+
+    @app.route('/profiles/<username>/<path:path>')
+    def profile_file(username, path):
+        """
+            Отдает файл профиля в формате collapsed stacks.
+
+            Аргументы:
+                username (str): Имя пользователя.
+                path (str): Путь к профилю относительно каталога профилей.
+
+            Возвращает:
+                Response: Файл профиля.
+            """
+        if 'userLogged' not in session or session['userLogged'] != username:
+            logger.warning('Неавторизованный доступ к профилю %s', path)
+            abort(401)
+
+        return send_from_directory(app.config['PROFILE_DIR'], path, mimetype='text/plain', as_attachment=True)
+
     @app.route('/up_del_tour_page/<username>', methods=['POST', 'GET'])
+    @read_only
     def up_del_tour_page(username):
         """
             Отображает страницу для изменения или удаления туров.
@@ -128,7 +273,7 @@ def setup_admin_routes(app):
             logger.warning('Неавторизованный доступ к изменению/удалению туров %s', username)
             abort(401)
 
-        with SessionLocal() as sessionloc:
+        with get_session() as sessionloc:
             query = select(TourTable)
             result = sessionloc.execute(query)
             tour_models = result.scalars().all()
@@ -140,6 +285,7 @@ def setup_admin_routes(app):
         return render_template('admin/admin_up_or_del_tour_page.html', tour_models=tour_models)
 
     @app.route('/up_del_tour_page/update/<tour_id>', methods=['POST', 'GET'])
+    @admission_control
     def update_tour(tour_id):
         """
             Обрабатывает запросы на обновление информации о туре.
@@ -151,7 +297,7 @@ def setup_admin_routes(app):
                 HTML: Шаблон для обновления тура или сообщение об ошибках валидации.
             """
         if request.method == 'POST':
-            with SessionLocal() as sessionloc:
+            with get_session() as sessionloc:
                 query = select(TourTable).where(TourTable.id == tour_id)
                 result = sessionloc.execute(query)
                 tour_model = result.scalars().first()
@@ -160,6 +306,20 @@ def setup_admin_routes(app):
                     logger.warning('Тур с ID %s не найден для обновления.', tour_id)
                     return render_template('user/empty_list_tours_page.html')
 
+                # Проверка, что тур не изменился с момента открытия формы
+                # Форма без версии (или с испорченной версией) считается устаревшей
+                version = request.form.get('version', '')
+                if not re.match(r'^\d+$', version):
+                    flash('Некорректная версия тура, откройте форму заново', category='error')
+                    logger.warning('Некорректная версия тура %s в форме: %r', tour_id, version)
+                    return redirect(url_for('update_tour', tour_id=tour_id))
+
+                if int(version) != tour_model.version:
+                    flash('Тур был изменен другим пользователем, проверьте данные и повторите', category='error')
+                    logger.warning('Конфликт версий при обновлении тура %s: форма %s, база %s',
+                                   tour_id, version, tour_model.version)
+                    return redirect(url_for('update_tour', tour_id=tour_id))
+
                 # Получение данных из формы
                 title = request.form['title']
                 description = request.form['description']
@@ -240,6 +400,11 @@ def setup_admin_routes(app):
 
                 # Если все проверки пройдены, обновляем тур
                 else:
+                    # Клиентам тура отправляется уведомление, если изменилась дата начала
+                    if tour_model.start_date_tour != start_date_tour:
+                        enqueue_date_change(sessionloc, tour_model.id, title, tour_model.start_date_tour,
+                                            start_date_tour)
+
                     tour_model.title = title
                     tour_model.description = description
                     tour_model.place = place
@@ -250,14 +415,26 @@ def setup_admin_routes(app):
                     tour_model.occupied_places = occupied_places
                     tour_model.price_per_person = price_per_person
 
-                    sessionloc.commit()
+                    try:
+                        sessionloc.commit()
+                    except StaleDataError:
+                        sessionloc.rollback()
+                        flash('Тур был изменен другим пользователем, проверьте данные и повторите',
+                              category='error')
+                        logger.warning('Конфликт версий при сохранении тура %s.', tour_id)
+                        return redirect(url_for('update_tour', tour_id=tour_id))
                     flash('Тур успешно обновлен', category='success')
                     logger.info('Тур с ID %s успешно обновлен.', tour_id)
                     return redirect(url_for('update_tour', tour_id=tour_id))
 
-        return render_template('admin/admin_update_tour_page.html')
+        with get_session() as sessionloc:
+            query = select(TourTable.version).where(TourTable.id == tour_id)
+            version = sessionloc.execute(query).scalar()
+
+        return render_template('admin/admin_update_tour_page.html', version=version)
 
     @app.route('/add_tour_page/<username>', methods=['POST', 'GET'])
+    @admission_control
     def add_tour_page(username):
         """
             Обрабатывает запросы на добавление нового тура.
@@ -353,7 +530,7 @@ def setup_admin_routes(app):
                 return redirect(url_for('add_tour_page', username=username))
 
             else:
-                with SessionLocal() as sessionloc:
+                with get_session() as sessionloc:
                     new_tour = TourTable(
                         title=title,
                         description=description,
@@ -378,6 +555,7 @@ def setup_admin_routes(app):
 
     # Удалить тур
     @app.route('/up_del_tour_page/delete/<tour_id>', methods=['POST', 'GET'])
+    @admission_control
     def delete_tour(tour_id):
         """
             Обрабатывает запросы на удаление тура.
@@ -389,7 +567,7 @@ def setup_admin_routes(app):
                 HTML: Шаблон для удаления тура или сообщение об ошибках.
             """
         if request.method == 'POST':
-            with SessionLocal() as sessionloc:
+            with get_session() as sessionloc:
                 query = select(TourTable).where(TourTable.id == tour_id)
                 result = sessionloc.execute(query)
                 tour_model = result.scalars().first()
@@ -402,8 +580,10 @@ def setup_admin_routes(app):
                 if action == "Удалить тур":
                     delete_query = delete(TourTable).where(TourTable.id == tour_id)
                     delete_user = delete(UserTable).where(UserTable.tour_id == tour_id)
+                    drop_tour_stats(sessionloc, tour_id)
                     sessionloc.execute(delete_query)
                     sessionloc.execute(delete_user)
+                    cancel_notifications(sessionloc, tour_ids=[tour_id])
                     sessionloc.commit()
                     flash('Тур удален', category='success')
                     logger.info('Тур с ID %s успешно удален.', tour_id)
@@ -413,6 +593,7 @@ def setup_admin_routes(app):
 
     # Удалить пользователя
     @app.route('/clients/delete/<user_id>/<tour_id>', methods=['POST', 'GET'])
+    @admission_control
     def delete_user(user_id, tour_id):
         """
             Обрабатывает запросы на удаление пользователя из тура и обновляет кол-во мест в туре.
@@ -425,7 +606,7 @@ def setup_admin_routes(app):
                 HTML: Шаблон для удаления пользователя или сообщение об ошибках.
             """
         if request.method == 'POST':
-            with SessionLocal() as sessionloc:
+            with get_session() as sessionloc:
                 query_tour = select(TourTable).where(TourTable.id == tour_id)
                 result = sessionloc.execute(query_tour)
                 tour_model = result.scalars().first()
@@ -442,6 +623,8 @@ def setup_admin_routes(app):
 
                     delete_user = delete(UserTable).where(UserTable.id == user_id)
                     sessionloc.execute(delete_user)
+                    record_booking(sessionloc, tour_id, user_model.number_of_people, sign=-1)
+                    cancel_notifications(sessionloc, user_ids=[user_id])
                     sessionloc.commit()
                     flash('Пользователь удален', category='success')
                     logger.info(
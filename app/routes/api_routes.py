@@ -0,0 +1,223 @@
+"""
+Данный файл отвечает за настройку JSON API (версия 1) для чтения туров и свободных мест.
+Ответы строятся из выборки отдельных столбцов без загрузки ORM-объектов, состав полей описывается
+Pydantic-схемой Tour, а сериализация выполняется orjson (при его наличии). ETag туров вычисляется по
+парам (id, version), поэтому ответ 304 не требует выборки полей и сериализации.
+"""
+
+import json
+import base64
+import hashlib
+import logging.config
+from datetime import date
+from flask import request
+from sqlalchemy import select
+from database.db import get_session, read_only, TourTable, Tour
+from routes.routes import not_modified
+from log_set.log_setting import LOGGING
+
+try:
+    import orjson
+except ImportError:
+    # orjson - необязательная зависимость, без нее используется стандартный json
+    orjson = None
+
+# Настройка логирования
+logging.config.dictConfig(LOGGING)
+logger = logging.getLogger('log')
+
+# Префикс версии API
+API_PREFIX = '/api/v1'
+
+# Размер страницы списка туров по умолчанию и максимальный
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Максимальное количество туров в одном запросе свободных мест
+MAX_AVAILABILITY_IDS = 100
+
+# Допустимый диапазон идентификаторов (64-битное целое со знаком, как INTEGER в SQLite);
+# значения вне его драйвер базы данных не принимает
+MIN_ID = -2 ** 63
+MAX_ID = 2 ** 63 - 1
+
+# Поля, доступные для выборки, в порядке схемы Tour
+TOUR_FIELDS = list(Tour.model_fields)
+
+
+def dumps(data):
+    """
+        Сериализует данные в JSON (bytes).
+        """
+    if orjson:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def parse_id(value):
+    """
+        Преобразует строку в идентификатор тура.
+
+        Исключения:
+            ValueError: Если строка не является числом или число вне диапазона [MIN_ID, MAX_ID].
+        """
+    tour_id = int(value)
+    if not MIN_ID <= tour_id <= MAX_ID:
+        raise ValueError(f'Идентификатор вне допустимого диапазона: {value}')
+    return tour_id
+
+
+def encode_cursor(tour_id):
+    return base64.urlsafe_b64encode(str(tour_id).encode()).decode()
+
+
+def decode_cursor(cursor):
+    return parse_id(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+
+def setup_api_routes(app):
+    """
+        Настраивает маршруты JSON API для приложения Flask.
+
+        Аргументы:
+            app: Экземпляр приложения Flask, к которому будут добавлены маршруты.
+        """
+
+    def json_response(data, status=200, etag=None):
+        """
+            Формирует JSON-ответ с ETag и отвечает 304, если клиентская копия актуальна.
+
+            Если etag не передан, он вычисляется по содержимому ответа.
+            """
+        body = dumps(data)
+        if status == 200 and etag is None:
+            etag = hashlib.md5(body).hexdigest()
+            response = not_modified(etag)
+            if response:
+                return response
+        response = app.response_class(body, status=status, mimetype='application/json')
+        if status == 200:
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+        return response
+
+    def error(message, status=400):
+        logger.warning('Ошибка запроса API %s: %s', request.full_path, message)
+        return json_response({'error': message}, status)
+
+    @app.route(f'{API_PREFIX}/tours')
+    @read_only
+    def api_tours():
+        """
+            Возвращает список предстоящих туров с курсорной пагинацией.
+
+            Параметры запроса:
+                fields (str): Поля через запятую (по умолчанию все поля схемы Tour).
+                limit (int): Размер страницы (не более MAX_LIMIT).
+                cursor (str): Курсор из next_cursor предыдущей страницы.
+
+            Возвращает:
+                JSON: {"data": [...], "next_cursor": str | null}.
+            """
+        fields = request.args.get('fields')
+        fields = [field for field in fields.split(',') if field] if fields else TOUR_FIELDS
+        unknown = set(fields) - set(TOUR_FIELDS)
+        if unknown:
+            return error(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+        # id нужен для курсора, поэтому выбирается всегда
+        if 'id' not in fields:
+            fields = ['id'] + fields
+
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else 0
+        except ValueError:
+            return error('Некорректные limit или cursor')
+        if limit < 1:
+            return error('limit должен быть больше 0')
+
+        def page(*columns):
+            return (select(*columns)
+                    .where(TourTable.start_date_tour >= date.today().isoformat(), TourTable.id > after)
+                    .order_by(TourTable.id)
+                    .limit(limit + 1))
+
+        with get_session() as sessionloc:
+            # ETag вычисляется по парам (id, version) страницы, поэтому при совпадении
+            # выборка полей и сериализация не выполняются
+            versions = sessionloc.execute(page(TourTable.id, TourTable.version)).all()
+            etag = 'api-tours-' + hashlib.md5(repr((fields, limit, after, versions)).encode()).hexdigest()
+            response = not_modified(etag)
+            if response:
+                return response
+
+            rows = sessionloc.execute(page(*[getattr(TourTable, field) for field in fields])).all()
+
+        next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+        data = [dict(row._mapping) for row in rows[:limit]]
+        logger.info('API: список туров, %d записей.', len(data))
+        return json_response({'data': data, 'next_cursor': next_cursor}, etag=etag)
+
+    @app.route(f'{API_PREFIX}/tours/<int:tour_id>')
+    @read_only
+    def api_tour(tour_id):
+        """
+            Возвращает тур по идентификатору в формате схемы Tour.
+
+            Аргументы:
+                tour_id (int): Идентификатор тура.
+            """
+        # Тура с идентификатором вне диапазона базы данных быть не может
+        if tour_id > MAX_ID:
+            return error(f'Тур с ID {tour_id} не найден', 404)
+
+        with get_session() as sessionloc:
+            version = sessionloc.execute(select(TourTable.version).where(TourTable.id == tour_id)).scalar()
+            if version is None:
+                return error(f'Тур с ID {tour_id} не найден', 404)
+
+            etag = f'api-tour-{tour_id}-v{version}'
+            response = not_modified(etag)
+            if response:
+                return response
+
+            query = (select(*[getattr(TourTable, field) for field in TOUR_FIELDS], TourTable.version)
+                     .where(TourTable.id == tour_id))
+            row = sessionloc.execute(query).first()
+
+        if row is None:
+            return error(f'Тур с ID {tour_id} не найден', 404)
+
+        logger.info('API: тур с ID %s.', tour_id)
+        # Версия берется из той же строки, что и данные, на случай изменения тура между запросами
+        return json_response(Tour.model_validate(dict(row._mapping)).model_dump(),
+                             etag=f'api-tour-{tour_id}-v{row.version}')
+
+    @app.route(f'{API_PREFIX}/availability')
+    @read_only
+    def api_availability():
+        """
+            Возвращает количество свободных мест для списка туров.
+
+            Параметры запроса:
+                ids (str): Идентификаторы туров через запятую (не более MAX_AVAILABILITY_IDS).
+
+            Возвращает:
+                JSON: {"data": {"<id>": свободные места}}; отсутствующие туры не включаются.
+            """
+        try:
+            ids = {parse_id(tour_id) for tour_id in request.args.get('ids', '').split(',') if tour_id}
+        except ValueError:
+            return error('ids должен содержать числа через запятую')
+        if not ids or len(ids) > MAX_AVAILABILITY_IDS:
+            return error(f'Укажите от 1 до {MAX_AVAILABILITY_IDS} идентификаторов')
+
+        query = (select(TourTable.id, TourTable.available_places)
+                 .where(TourTable.id.in_(ids))
+                 .order_by(TourTable.id))
+        with get_session() as sessionloc:
+            rows = sessionloc.execute(query).all()
+
+        logger.info('API: свободные места для %d туров.', len(rows))
+        return json_response({'data': {str(tour_id): available for tour_id, available in rows}})
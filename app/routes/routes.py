@@ -3,10 +3,14 @@
 """
 
 import re
+import hashlib
 import logging.config
-from flask import render_template, request, flash, redirect, url_for
-from database.db import SessionLocal, TourTable, UserTable
+from datetime import date
+from flask import render_template, request, flash, redirect, url_for, session, make_response
+from database.db import get_session, read_only, record_booking, TourTable, UserTable
 from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
+from limits.rate_limit import admission_control
 from log_set.log_setting import LOGGING
 
 # Настройка логирования
@@ -14,6 +18,40 @@ logging.config.dictConfig(LOGGING)
 logger = logging.getLogger('log')
 
 
+def not_modified(etag):
+    """
+        Проверяет, совпадает ли ETag с заголовком If-None-Match запроса.
+
+        Аргументы:
+            etag (str): Текущий ETag ресурса.
+
+        Возвращает:
+            Response | None: Ответ 304 без тела, если клиентская копия актуальна, иначе None.
+        """
+    if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(body, etag):
+    """
+        Формирует ответ с заголовком ETag, требующий перепроверки при каждом обращении.
+
+        Аргументы:
+            body (str): Тело ответа.
+            etag (str): ETag ресурса.
+
+        Возвращает:
+            Response: Ответ Flask.
+        """
+    response = make_response(body)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
 def setup_routes(app):
     """
         Настраивает маршруты для приложения Flask.
@@ -33,15 +71,28 @@ def setup_routes(app):
         return render_template('user/base_page.html')
 
     @app.route('/views/tours/')
+    @read_only
     def tours_page():
         """
             Обрабатывает запросы на страницу со списком туров.
 
-            Извлекает список туров из базы данных и отображает его. Если список пуст,
+            Извлекает список предстоящих туров из базы данных и отображает его. Если список пуст,
             возвращает страницу с сообщением об отсутствии туров.
             """
-        with SessionLocal() as sessionloc:
-            query = select(TourTable)
+        today = date.today().isoformat()
+        upcoming = TourTable.start_date_tour >= today
+        with get_session() as sessionloc:
+            # ETag вычисляется по парам (id, version) из покрывающего индекса (start_date_tour, id, version)
+            # без загрузки туров; сортировка в порядке индекса избавляет от сортировки результата
+            query = (select(TourTable.id, TourTable.version).where(upcoming)
+                     .order_by(TourTable.start_date_tour, TourTable.id))
+            versions = sessionloc.execute(query).all()
+            etag = 'tours-' + hashlib.md5(repr(versions).encode()).hexdigest()
+            response = not_modified(etag)
+            if response:
+                return response
+
+            query = select(TourTable).where(upcoming)
             result = sessionloc.execute(query)
             tour_models = result.scalars().all()
             if not tour_models:
@@ -49,9 +100,10 @@ def setup_routes(app):
                 return render_template('user/empty_list_tours_page.html')
 
         logger.info('Отображение списка туров, найдено %d туров.', len(tour_models))
-        return render_template('user/list_tours_page.html', tour_models=tour_models)
+        return with_etag(render_template('user/list_tours_page.html', tour_models=tour_models), etag)
 
     @app.route('/current_tour/<tour_id>', methods=['POST', 'GET'])
+    @admission_control
     def current_tour(tour_id):
         """
             Обрабатывает запросы на страницу конкретного тура.
@@ -62,7 +114,17 @@ def setup_routes(app):
             Возвращает страницу с информацией о туре. Если метод запроса POST,
             обрабатывает данные формы для бронирования тура.
             """
-        with SessionLocal() as sessionloc:
+        with get_session() as sessionloc:
+            # Страница с ожидающими flash-сообщениями не кэшируется
+            etag = None
+            if request.method == 'GET' and '_flashes' not in session:
+                version = sessionloc.execute(select(TourTable.version).where(TourTable.id == tour_id)).scalar()
+                if version is not None:
+                    etag = f'tour-{tour_id}-v{version}'
+                    response = not_modified(etag)
+                    if response:
+                        return response
+
             query = select(TourTable).where(TourTable.id == tour_id)
             result = sessionloc.execute(query)
             tour_model = result.scalars().first()
@@ -117,7 +179,15 @@ def setup_routes(app):
                     tour_model.available_places -= int(number_of_people)
                     tour_model.occupied_places += int(number_of_people)
                     sessionloc.add(new_user)
-                    sessionloc.commit()
+                    record_booking(sessionloc, tour_id, number_of_people)
+                    try:
+                        sessionloc.commit()
+                    except StaleDataError:
+                        # Тур изменился после чтения (параллельное бронирование или правка админом)
+                        sessionloc.rollback()
+                        flash('Данные тура изменились, попробуйте еще раз', category='error')
+                        logger.warning('Конфликт версий при бронировании тура с ID %s.', tour_id)
+                        return redirect(url_for('current_tour', tour_id=tour_id))
 
                     logger.info('Пользователь %s успешно забронировал %s мест на тур с ID %s.',
                                 name, number_of_people, tour_id)
@@ -139,4 +209,7 @@ def setup_routes(app):
                                     )
 
             logger.info('Отображение страницы бронирования для тура с ID %s.', tour_id)
-            return render_template('user/book_tour_page.html', tour_model=tour_model)
+            body = render_template('user/book_tour_page.html', tour_model=tour_model)
+            if etag:
+                return with_etag(body, f'tour-{tour_id}-v{tour_model.version}')
+            return body
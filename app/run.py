@@ -4,12 +4,20 @@
 """
 
 import os
+import click
 import logging.config
 from flask import Flask, render_template
 from flask_mail import Mail, Message
-from database.db import create_tables
+from werkzeug.middleware.proxy_fix import ProxyFix
+from database.db import create_tables, rebuild_stats, archive_past_tours, SessionLocal
 from routes.admin_routes import setup_admin_routes
 from routes.routes import setup_routes
+from routes.api_routes import setup_api_routes
+from compression.compression import setup_compression
+from profiling.profiler import setup_profiler
+from offload.static_offload import setup_static_offload
+from limits.rate_limit import setup_rate_limit
+from notifications.notifier import enqueue_reminders, send_pending, REMINDER_DAYS, BATCH_SIZE, RATE_LIMIT
 from log_set.log_setting import LOGGING
 
 # Настройка логирования
@@ -28,19 +36,50 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 app.config['SECRET_KEY'] = 'jsdhfuihf13485hjadsnvj98sdva8y7v'
 
 # Настройка конфигурации для отправки почты
-app.config['MAIL_SERVER'] = 'smtp.yandex.ru'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = 'Andrej10best@yandex.ru'
+# (сервер можно переопределить переменными окружения, например для локального тестового SMTP)
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.yandex.ru')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '1') == '1'
+app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', 'Andrej10best@yandex.ru')
 app.config['MAIL_PASSWORD'] = 'xwijghlbqktxboja'
 app.config['MAIL_DEFAULT_SENDER'] = 'Andrej10best@yandex.ru'
 
 # Инициализация расширения Flask-Mail
 mail = Mail(app)
 
+# Настройка сжатия ответов (gzip/brotli)
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_LEVEL'] = 6
+setup_compression(app)
+
+# Настройка выборочного профилирования запросов (доля запросов и токен заголовка X-Profile);
+# без переменной окружения PROFILE_TOKEN профилирование по заголовку отключено
+app.config['PROFILE_SAMPLE_RATE'] = 0.0
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN') or None
+app.config['PROFILE_MAX_PER_ENDPOINT'] = 20
+app.config['PROFILE_DIR'] = os.path.join(base_path, 'profiles')
+setup_profiler(app)
+
+# Отдача статики и изображений туров фронтенд-прокси: None, 'x-accel' (nginx) или 'x-sendfile'
+app.config['STATIC_OFFLOAD'] = os.environ.get('STATIC_OFFLOAD') or None
+app.config['STATIC_ACCEL_PREFIX'] = '/_static/'
+setup_static_offload(app)
+
+# Количество доверенных прокси перед приложением (например, 1 за nginx). ProxyFix берет адрес клиента
+# из X-Forwarded-For, иначе все клиенты имели бы адрес прокси и общую корзину ограничения частоты
+app.config['PROXY_HOPS'] = int(os.environ.get('PROXY_HOPS', 0))
+if app.config['PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'], x_proto=app.config['PROXY_HOPS'],
+                            x_host=app.config['PROXY_HOPS'])
+
+# Хранилище контроля допуска: 'memory' (по умолчанию) или путь к файлу SQLite, общему для воркеров
+app.config['RATE_LIMIT_STORAGE'] = os.environ.get('RATE_LIMIT_STORAGE') or None
+setup_rate_limit(app)
+
 # Настройка маршрутов приложения
 setup_routes(app)
 setup_admin_routes(app)
+setup_api_routes(app)
 
 
 @app.route('/success/<email>/<title>/<date>/<duration>/<number_of_people>/<price>')
@@ -78,6 +117,49 @@ def success_page(email, title, date, duration, number_of_people, price):
     return render_template('user/success_book_page.html')
 
 
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """
+        Пересчитывает сводную таблицу статистики по бронированиям и выводит туры с расхождениями.
+
+        Запуск из каталога app: PYTHONPATH=. flask --app run rebuild-stats
+        """
+    with SessionLocal() as sessionloc:
+        mismatched = rebuild_stats(sessionloc)
+    if mismatched:
+        print(f'Исправлены расхождения для туров: {", ".join(map(str, mismatched))}')
+    else:
+        print('Сводная таблица согласована с бронированиями.')
+
+
+@app.cli.command('archive-tours')
+@click.option('--batch-size', default=100, show_default=True, help='Количество туров в одной транзакции.')
+def archive_tours_command(batch_size):
+    """
+        Переносит прошедшие туры и их бронирования в архивные таблицы. Предназначена для запуска по cron.
+
+        Запуск из каталога app: PYTHONPATH=. flask --app run archive-tours
+        """
+    archived = archive_past_tours(batch_size=batch_size)
+    print(f'Перенесено в архив туров: {archived}')
+
+
+@app.cli.command('send-notifications')
+@click.option('--days', default=REMINDER_DAYS, show_default=True, help='За сколько дней до тура напоминать.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Писем на одно SMTP-соединение.')
+@click.option('--rate', default=RATE_LIMIT, show_default=True, help='Максимум писем в секунду.')
+def send_notifications_command(days, batch_size, rate):
+    """
+        Ставит в очередь напоминания о предстоящих турах и отправляет все ожидающие уведомления.
+        Предназначена для запуска по cron (например, раз в час).
+
+        Запуск из каталога app: PYTHONPATH=. flask --app run send-notifications
+        """
+    enqueue_reminders(days=days)
+    sent, failed = send_pending(mail, batch_size=batch_size, rate=rate)
+    print(f'Отправлено уведомлений: {sent}, ошибок: {failed}')
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     """
@@ -0,0 +1,98 @@
+"""
+Замер сжатия ответов (compression/compression.py).
+
+Заполняет временную базу данных (по умолчанию 1000 туров и 10000 бронирований) и запрашивает
+список туров и список клиентов без сжатия и с каждой доступной кодировкой и уровнем. Для каждого
+варианта выводит размер ответа, долю сэкономленных байт и процессорное время запроса (медиана
+по --repeat повторам) с приростом относительно ответа без сжатия.
+
+Тестовые данные синтетические и однообразные, поэтому на реальных данных степень сжатия ниже.
+
+Запуск из корня репозитория:
+    python bench/bench_compression.py [--tours 1000] [--users 10000] [--levels 1,6] [--repeat 15]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+WORKDIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{WORKDIR}/bench.db'
+sys.path.insert(0, APP_DIR)
+
+from sqlalchemy import insert  # noqa: E402
+import run  # noqa: E402
+from compression import compression  # noqa: E402
+from database.db import engine, TourTable, UserTable  # noqa: E402
+
+# Запись в logs.log отключается, чтобы не засорять журнал
+logging.getLogger('log').disabled = True
+
+PAGES = ['/views/tours/', '/clients/admin']
+
+
+def seed(tours, users):
+    run.create_tables()
+    with engine.begin() as conn:
+        conn.execute(insert(TourTable), [
+            {'id': i, 'title': f'Тур {i}', 'description': f'Описание тура {i}. ' * 20, 'place': 'Карелия',
+             'start_date_tour': '2030-01-01', 'duration': 5, 'max_people': 100, 'available_places': 90,
+             'occupied_places': 10, 'price_per_person': 1000 + i, 'image_path': 'Карелия.jpg'}
+            for i in range(1, tours + 1)
+        ])
+        conn.execute(insert(UserTable), [
+            {'id': i, 'name': f'Клиент {i}', 'email': f'user{i}@mail.ru', 'phone': 79990000000 + i,
+             'number_of_people': 1 + i % 4, 'tour_id': (i - 1) % tours + 1}
+            for i in range(1, users + 1)
+        ])
+
+
+def measure(client, path, encoding, repeat):
+    """
+        Возвращает размер ответа и медиану процессорного времени запроса, мс.
+        """
+    headers = {'Accept-Encoding': encoding or 'identity'}
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        response = client.get(path, headers=headers)
+        timings.append((time.process_time() - started) * 1000)
+    assert response.headers.get('Content-Encoding') == encoding, response.headers
+    return len(response.get_data()), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tours', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--levels', default='1,6', help='уровни gzip через запятую')
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args()
+
+    seed(args.tours, args.users)
+    app = run.app
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['userLogged'] = 'admin'
+
+    variants = [('gzip', 'COMPRESS_LEVEL', int(level)) for level in args.levels.split(',')]
+    if compression.brotli:
+        variants.append(('br', 'COMPRESS_BR_LEVEL', app.config['COMPRESS_BR_LEVEL']))
+
+    for path in PAGES:
+        size, base = measure(client, path, None, args.repeat)
+        print(f'{path}: без сжатия {size / 1024:.0f} КиБ, {base:.1f} мс CPU')
+        for encoding, key, level in variants:
+            app.config[key] = level
+            compressed, cpu = measure(client, path, encoding, args.repeat)
+            print(f'  {encoding} {level}: {compressed / 1024:.0f} КиБ (-{100 - compressed * 100 / size:.1f}%), '
+                  f'{cpu:.1f} мс CPU ({cpu - base:+.1f} мс)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Нагрузочный тест отдачи статики (offload/static_offload.py).
+
+Запускает приложение на реальном WSGI-сервере (werkzeug, многопоточный) и скачивает фон сайта и
+изображения туров множеством параллельных медленных клиентов. Число одновременно обслуживаемых
+запросов ограничено --workers, как у пула синхронных воркеров gunicorn/uwsgi. Для каждого режима
+выводится суммарное время занятости воркеров (от вызова приложения до закрытия ответа, включая
+передачу тела медленному клиенту), среднее время занятости на запрос и пропускная способность.
+
+В режиме x-accel приложение отвечает только заголовками, а байты файла в реальной установке
+отправляет nginx; бенчмарк измеряет именно освобождаемое время Python-воркеров.
+
+Запуск из корня репозитория:
+    python bench/bench_static_offload.py [--requests 400] [--clients 32] [--workers 4]
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+WORKDIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{WORKDIR}/bench.db'
+sys.path.insert(0, APP_DIR)
+
+from werkzeug.serving import make_server  # noqa: E402
+import run  # noqa: E402
+from offload.static_offload import setup_static_offload  # noqa: E402
+
+# Журнал запросов сервера и запись в logs.log отключаются, чтобы не искажать замер и не засорять журнал
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+logging.getLogger('log').disabled = True
+
+# Скачиваемые файлы: фон сайта и изображения туров
+FILES = ['site_background/back_img.jpg'] + [
+    f'image/img_tour/{name}' for name in sorted(os.listdir(os.path.join(APP_DIR, 'static', 'image', 'img_tour')))
+]
+
+# Размер буферов сокетов, чтобы медленный клиент действительно задерживал отправляющий воркер
+SOCKET_BUFFER = 32 * 1024
+
+
+class WorkerPool:
+    """
+        WSGI-прослойка, моделирующая пул из workers синхронных воркеров и измеряющая время их занятости.
+
+        Воркер считается занятым от вызова приложения до закрытия ответа сервером, то есть
+        до окончания отправки тела клиенту.
+        """
+
+    def __init__(self, app, workers):
+        self.app = app
+        self.slots = threading.BoundedSemaphore(workers)
+        self.lock = threading.Lock()
+        self.busy = 0.0
+
+    def __call__(self, environ, start_response):
+        self.slots.acquire()
+        started = time.perf_counter()
+        try:
+            body = self.app(environ, start_response)
+        except Exception:
+            self._release(started)
+            raise
+        return _ClosingIterator(body, lambda: self._release(started))
+
+    def _release(self, started):
+        with self.lock:
+            self.busy += time.perf_counter() - started
+        self.slots.release()
+
+
+class _ClosingIterator:
+    def __init__(self, body, callback):
+        self.body = body
+        self.callback = callback
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.callback()
+
+
+def download(port, path, chunk, delay):
+    """
+        Скачивает файл, читая ответ порциями по chunk байт с паузой delay между ними (медленный клиент).
+
+        Возвращает:
+            tuple: Код ответа и количество полученных байт.
+        """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        sock.settimeout(60)
+        sock.connect(('127.0.0.1', port))
+        sock.sendall(f'GET /static/{quote(path)} HTTP/1.0\r\nHost: bench\r\n\r\n'.encode())
+        received = b''
+        while True:
+            data = sock.recv(chunk)
+            if not data:
+                break
+            received += data
+            time.sleep(delay)
+    status = int(received.split(b' ', 2)[1])
+    return status, len(received)
+
+
+def load(port, pool, requests, clients, chunk, delay):
+    pool.busy = 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        results = list(executor.map(lambda number: download(port, FILES[number % len(FILES)], chunk, delay),
+                                    range(requests)))
+    elapsed = time.perf_counter() - started
+    return Counter(status for status, _ in results), sum(size for _, size in results), elapsed, pool.busy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--clients', type=int, default=32, help='одновременных клиентов')
+    parser.add_argument('--workers', type=int, default=4, help='одновременно обслуживаемых запросов')
+    parser.add_argument('--chunk', type=int, default=16 * 1024, help='порция чтения клиента, байт')
+    parser.add_argument('--delay', type=float, default=0.002, help='пауза клиента между порциями, сек')
+    args = parser.parse_args()
+
+    app = run.app
+    pool = WorkerPool(app.wsgi_app, args.workers)
+    app.wsgi_app = pool
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    flask_static = app.view_functions['static']
+    for mode in (None, 'x-accel'):
+        app.view_functions['static'] = flask_static
+        app.config['STATIC_OFFLOAD'] = mode
+        setup_static_offload(app)
+
+        statuses, size, elapsed, busy = load(server.server_port, pool, args.requests, args.clients,
+                                             args.chunk, args.delay)
+        print(f'{mode or "Flask (без offload)"}: {dict(statuses)}, получено {size / 2 ** 20:.1f} МиБ, '
+              f'занятость воркеров {busy:.2f} с ({busy / args.requests * 1000:.1f} мс на запрос), '
+              f'пропускная способность {args.requests / elapsed:.0f} запр/с')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Нагрузочный тест контроля допуска (limits/rate_limit.py).
+
+Запускает приложение на реальном WSGI-сервере (werkzeug, многопоточный) с временной базой данных
+и отправляет поток бронирований (POST /current_tour/<id>) от множества клиентов, превышающий
+пропускную способность единственного писателя SQLite. Выводит распределение кодов ответа и
+задержки p50/p99 с контролем допуска и без него; завершается с кодом 1, если p99 с контролем
+допуска превышает --max-p99.
+
+Запуск из корня репозитория:
+    python bench/load_test_admission.py [--requests 3000] [--threads 64] [--clients 200]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+WORKDIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{WORKDIR}/bench.db'
+sys.path.insert(0, APP_DIR)
+
+from werkzeug.serving import make_server  # noqa: E402
+import run  # noqa: E402
+from limits import rate_limit  # noqa: E402
+from database.db import SessionLocal, TourTable  # noqa: E402
+
+# Журнал запросов сервера и запись в logs.log отключаются, чтобы не искажать замер и не засорять журнал
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+logging.getLogger('log').disabled = True
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+opener = urllib.request.build_opener(NoRedirect)
+
+
+def seed():
+    run.create_tables()
+    with SessionLocal() as sessionloc:
+        sessionloc.add(TourTable(title='Нагрузка', description='Тур', place='Карелия', start_date_tour='2030-01-01',
+                                 duration=5, max_people=10 ** 6, available_places=10 ** 6, occupied_places=0,
+                                 price_per_person=1000, image_path='Карелия.jpg'))
+        sessionloc.commit()
+
+
+def book(base_url, number, clients):
+    data = urllib.parse.urlencode({'name': 'Клиент', 'email': 'client@mail.ru', 'phone': '+79990000000',
+                                   'number_of_people': '1'}).encode()
+    # Адрес клиента передается через X-Forwarded-For (приложение за прокси, PROXY_HOPS=1)
+    req = urllib.request.Request(f'{base_url}/current_tour/1', data=data,
+                                 headers={'X-Forwarded-For': f'10.0.{number % clients // 250}.{number % 250}'})
+    started = time.perf_counter()
+    try:
+        status = opener.open(req, timeout=30).status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 'timeout'
+    return time.perf_counter() - started, status
+
+
+def load(base_url, requests, threads, clients):
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(lambda number: book(base_url, number, clients), range(requests)))
+    latencies = sorted(latency for latency, _ in results)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return Counter(status for _, status in results), p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--max-p99', type=float, default=1.0, help='допустимая p99 с контролем допуска, сек')
+    args = parser.parse_args()
+
+    seed()
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    run.app.wsgi_app = ProxyFix(run.app.wsgi_app, x_for=1)
+    server = make_server('127.0.0.1', 0, run.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = {}
+    for mode in ('без контроля допуска', 'с контролем допуска'):
+        if mode == 'без контроля допуска':
+            limits = (10 ** 9, 10 ** 9, 10 ** 9)
+        else:
+            limits = (rate_limit.CLIENT_CAPACITY, rate_limit.GLOBAL_CAPACITY, rate_limit.MAX_CONCURRENT_WRITERS)
+        saved = rate_limit.CLIENT_CAPACITY, rate_limit.GLOBAL_CAPACITY
+        rate_limit.CLIENT_CAPACITY, rate_limit.GLOBAL_CAPACITY = limits[0], limits[1]
+        rate_limit.set_backend(rate_limit.MemoryBackend(max_writers=limits[2]))
+        statuses, p50, p99 = load(base_url, args.requests, args.threads, args.clients)
+        rate_limit.CLIENT_CAPACITY, rate_limit.GLOBAL_CAPACITY = saved
+        results[mode] = p99
+        print(f'{mode}: {dict(statuses)}, p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс')
+
+    server.shutdown()
+    if results['с контролем допуска'] > args.max_p99:
+        print(f'p99 с контролем допуска превышает {args.max_p99} сек')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
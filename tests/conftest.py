@@ -0,0 +1,18 @@
+"""
+Общая настройка тестов: модули приложения импортируются из каталога app (как при запуске run.py),
+а база данных создается во временном каталоге, чтобы тесты не трогали data.db.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/test.db'
+sys.path.insert(0, APP_DIR)
+
+import run  # noqa: E402, F401
+
+# Запись в logs.log отключается, чтобы тесты не засоряли журнал приложения
+logging.getLogger('log').disabled = True
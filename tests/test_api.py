@@ -0,0 +1,44 @@
+"""
+Проверка обработки некорректных идентификаторов в JSON API (routes/api_routes.py).
+
+Запуск из корня репозитория:
+    python -m pytest tests/test_api.py
+"""
+
+import pytest
+
+import run
+from routes.api_routes import encode_cursor, MAX_ID, MIN_ID
+
+
+@pytest.fixture
+def client():
+    run.create_tables()
+    return run.app.test_client()
+
+
+@pytest.mark.parametrize('ids', [str(MAX_ID + 1), f'1,{MIN_ID - 1}', '9' * 40, 'abc'])
+def test_availability_rejects_ids_out_of_range(client, ids):
+    response = client.get('/api/v1/availability', query_string={'ids': ids})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_availability_accepts_range_bounds(client):
+    response = client.get('/api/v1/availability', query_string={'ids': f'{MAX_ID},{MIN_ID}'})
+    assert response.status_code == 200
+    assert response.get_json() == {'data': {}}
+
+
+@pytest.mark.parametrize('tour_id', [MAX_ID, MAX_ID + 1, 10 ** 40])
+def test_tour_out_of_range_is_not_found(client, tour_id):
+    response = client.get(f'/api/v1/tours/{tour_id}')
+    assert response.status_code == 404
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('cursor', [encode_cursor(MAX_ID + 1), encode_cursor(10 ** 40), '%%%', encode_cursor('x')])
+def test_tours_rejects_bad_cursor(client, cursor):
+    response = client.get('/api/v1/tours', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
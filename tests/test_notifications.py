@@ -0,0 +1,166 @@
+"""
+Проверка рассылки уведомлений (notifications/notifier.py) с локальным SMTP-сервером в процессе теста.
+
+Запуск из корня репозитория:
+    python -m pytest tests/test_notifications.py
+"""
+
+import threading
+import socketserver
+from datetime import date, timedelta
+
+import pytest
+from flask import Flask
+from flask_mail import Mail
+from sqlalchemy import select
+
+import run
+from database.db import Base, SessionLocal, TourTable, UserTable, NotificationTable, engine, create_tables
+from notifications.notifier import enqueue_reminders, send_pending
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+        Минимальный SMTP-сервер: принимает письма и сохраняет получателей каждого письма.
+        """
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 stand-in')
+        recipients = []
+        for line in self.rfile:
+            command, _, argument = line.decode().strip().partition(' ')
+            command = command.upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 stand-in')
+            elif command == 'RCPT':
+                recipients.append(argument.split(':', 1)[1].strip('<>'))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                self.server.messages.append(recipients)
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                break
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mail(smtp):
+    mail_app = Flask(__name__)
+    mail_app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp.server_address[1], MAIL_USE_TLS=False,
+                           MAIL_USERNAME=None, MAIL_DEFAULT_SENDER='tours@mail.ru')
+    with mail_app.app_context():
+        yield Mail(mail_app)
+
+
+@pytest.fixture
+def bookings():
+    """
+        Тур через 2 дня с тремя бронированиями и тур через 10 дней (вне окна напоминаний) с одним.
+        """
+    Base.metadata.drop_all(bind=engine)
+    create_tables()
+    today = date.today()
+    with SessionLocal() as sessionloc:
+        for tour_id, days in ((1, 2), (2, 10)):
+            sessionloc.add(TourTable(id=tour_id, title=f'Тур {tour_id}', description='Описание', place='Карелия',
+                                     start_date_tour=(today + timedelta(days=days)).isoformat(), duration=5,
+                                     max_people=10, available_places=6, occupied_places=4, price_per_person=1000,
+                                     image_path='Карелия.jpg'))
+        sessionloc.add_all([UserTable(id=user_id, name=f'Клиент {user_id}', email=f'user{user_id}@mail.ru',
+                                      phone=79990000000 + user_id, number_of_people=1, tour_id=tour_id)
+                            for user_id, tour_id in ((1, 1), (2, 1), (3, 1), (4, 2))])
+        sessionloc.commit()
+
+
+@pytest.fixture
+def admin():
+    client = run.app.test_client()
+    with client.session_transaction() as sess:
+        sess['userLogged'] = 'admin'
+    return client
+
+
+def statuses():
+    with SessionLocal() as sessionloc:
+        query = select(NotificationTable.user_id, NotificationTable.kind, NotificationTable.status)
+        return {(user_id, kind): status for user_id, kind, status in sessionloc.execute(query)}
+
+
+def test_second_run_sends_nothing(bookings, mail, smtp):
+    assert enqueue_reminders() == 3
+    assert send_pending(mail, rate=0) == (3, 0)
+    assert sorted(smtp.messages) == [['user1@mail.ru'], ['user2@mail.ru'], ['user3@mail.ru']]
+
+    enqueue_reminders()
+    assert send_pending(mail, rate=0) == (0, 0)
+    assert len(smtp.messages) == 3
+
+
+def test_concurrent_runs_do_not_duplicate(bookings, mail, smtp):
+    enqueue_reminders()
+    results = []
+
+    def deliver():
+        with mail.app.app_context():
+            results.append(send_pending(mail, batch_size=1, rate=50))
+
+    runs = [threading.Thread(target=deliver) for _ in range(2)]
+    for thread in runs:
+        thread.start()
+    for thread in runs:
+        thread.join()
+
+    assert sum(sent for sent, _ in results) == 3
+    assert sorted(smtp.messages) == [['user1@mail.ru'], ['user2@mail.ru'], ['user3@mail.ru']]
+
+
+def test_deleted_booking_cancels_pending_notices(bookings, mail, smtp, admin):
+    enqueue_reminders()
+    response = admin.post('/clients/delete/2/1', data={'action': 'Удалить пользователя'})
+    assert response.status_code == 302
+    assert statuses()[(2, 'reminder')] == 'cancelled'
+
+    assert send_pending(mail, rate=0) == (2, 0)
+    assert sorted(smtp.messages) == [['user1@mail.ru'], ['user3@mail.ru']]
+
+
+def test_deleted_tour_cancels_pending_notices(bookings, admin):
+    enqueue_reminders()
+    response = admin.post('/up_del_tour_page/delete/1', data={'action': 'Удалить тур'})
+    assert response.status_code == 302
+    assert {status for (_, kind), status in statuses().items() if kind == 'reminder'} == {'cancelled'}
+
+
+def test_date_change_cancels_pending_reminders(bookings, admin):
+    enqueue_reminders()
+    response = admin.post('/up_del_tour_page/update/1', data={
+        'title': 'Тур 1', 'description': 'Описание', 'place': 'Карелия',
+        'start_date_tour': (date.today() + timedelta(days=30)).isoformat(), 'duration': '5', 'max_people': '9',
+        'available_places': '6', 'occupied_places': '4', 'price_per_person': '1000', 'version': '1',
+    })
+    assert response.status_code == 302
+
+    current = statuses()
+    assert {current[(user_id, 'reminder')] for user_id in (1, 2, 3)} == {'cancelled'}
+    assert {current[(user_id, 'date_change')] for user_id in (1, 2, 3)} == {'pending'}
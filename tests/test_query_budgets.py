@@ -0,0 +1,169 @@
+"""
+Проверка бюджетов SQL-запросов маршрутов (query_budget/budget.py).
+
+Каждый маршрут выполняется на небольшой (10 туров, 100 клиентов) и на большой (1000 туров,
+10000 клиентов) базе: число запросов не должно превышать бюджет и расти вместе с количеством
+строк, иначе в маршруте появился N+1 запрос.
+
+Запуск из корня репозитория:
+    python -m pytest tests/test_query_budgets.py
+"""
+
+from io import BytesIO
+
+import pytest
+from sqlalchemy import insert
+
+import run
+from database.db import (Base, SessionLocal, TourTable, UserTable, engine, create_tables, rebuild_stats,
+                         archive_past_tours)
+from query_budget.budget import BUDGETS, QueryCounter
+
+# Размеры баз данных, на которых проверяются бюджеты: (туры, клиенты)
+SIZES = [(10, 100), (1000, 10000)]
+
+TOUR_FORM = {
+    'title': 'Тур', 'description': 'Описание', 'place': 'Карелия', 'start_date_tour': '2031-01-01',
+    'duration': '5', 'max_people': '9', 'available_places': '8', 'occupied_places': '1',
+    'price_per_person': '100',
+}
+
+# Запросы для проверки: (endpoint, метод, путь, данные формы); {tours} - количество туров в базе.
+# Удаляющие запросы идут последними и затрагивают разные строки.
+CASES = [
+    ('welcome_page', 'GET', '/', None),
+    ('tours_page', 'GET', '/views/tours/', None),
+    ('current_tour', 'GET', '/current_tour/1', None),
+    ('current_tour', 'POST', '/current_tour/1',
+     {'name': 'Клиент', 'email': 'client@mail.ru', 'phone': '+79990000000', 'number_of_people': '1'}),
+    ('success_page', 'GET', '/success/client@mail.ru/Тур/2030-01-01/5/1/1000', None),
+    ('api_tours', 'GET', '/api/v1/tours?limit=200&fields=title,price_per_person', None),
+    ('api_tour', 'GET', '/api/v1/tours/1', None),
+    ('api_availability', 'GET', '/api/v1/availability?ids=' + ','.join(map(str, range(1, 101))), None),
+    ('admin_page', 'GET', '/admin', None),
+    ('admin_page', 'POST', '/admin', {'username': 'admin', 'psw': 'admin'}),
+    ('profile_page', 'GET', '/profile/admin', None),
+    ('profile_page', 'POST', '/profile/admin', {'action': 'Клиенты'}),
+    ('clients', 'GET', '/clients/admin', None),
+    ('dashboard', 'GET', '/dashboard/admin', None),
+    ('archive', 'GET', '/archive/admin', None),
+    ('archive_tour', 'GET', '/archive/admin/1', None),
+    ('profiles', 'GET', '/profiles/admin', None),
+    ('profile_file', 'GET', '/profiles/admin/tours_page/budget.folded', None),
+    ('up_del_tour_page', 'GET', '/up_del_tour_page/admin', None),
+    ('up_del_tour_page', 'POST', '/up_del_tour_page/admin', None),
+    ('update_tour', 'GET', '/up_del_tour_page/update/1', None),
+    ('update_tour', 'POST', '/up_del_tour_page/update/1', dict(TOUR_FORM, version='1')),
+    ('add_tour_page', 'GET', '/add_tour_page/admin', None),
+    ('add_tour_page', 'POST', '/add_tour_page/admin', TOUR_FORM),
+    ('delete_user', 'GET', '/clients/delete/1/1', None),
+    ('delete_user', 'POST', '/clients/delete/1/1', {'action': 'Удалить пользователя'}),
+    ('delete_tour', 'GET', '/up_del_tour_page/delete/{tours}', None),
+    ('delete_tour', 'POST', '/up_del_tour_page/delete/{tours}', {'action': 'Удалить тур'}),
+]
+
+# Количество запросов маршрутов на каждой базе: {(туры, клиенты): {(endpoint, метод): запросы}}
+COUNTS = {}
+
+
+def seed_database(tours, users):
+    """
+        Пересоздает таблицы и заполняет базу турами и клиентами, а также одним архивным туром.
+        """
+    Base.metadata.drop_all(bind=engine)
+    create_tables()
+    with engine.begin() as conn:
+        conn.execute(insert(TourTable), [
+            {'id': i, 'title': f'Тур {i}', 'description': 'Описание тура', 'place': 'Карелия',
+             'start_date_tour': '2030-01-01', 'duration': 5, 'max_people': 100, 'available_places': 90,
+             'occupied_places': 10, 'price_per_person': 1000, 'image_path': 'Карелия.jpg'}
+            for i in range(1, tours + 1)
+        ])
+        conn.execute(insert(UserTable), [
+            {'id': i, 'name': f'Клиент {i}', 'email': f'user{i}@mail.ru', 'phone': 79990000000 + i,
+             'number_of_people': 1, 'tour_id': (i - 1) % tours + 1}
+            for i in range(1, users + 1)
+        ])
+        # Прошедший тур с бронированиями, который будет перенесен в архив
+        conn.execute(insert(TourTable), [
+            {'id': tours + 1, 'title': 'Архивный тур', 'description': 'Описание тура', 'place': 'Карелия',
+             'start_date_tour': '2000-01-01', 'duration': 5, 'max_people': users, 'available_places': 0,
+             'occupied_places': users, 'price_per_person': 1000, 'image_path': 'Карелия.jpg'}
+        ])
+        conn.execute(insert(UserTable), [
+            {'id': users + i, 'name': f'Клиент {i}', 'email': f'archive{i}@mail.ru', 'phone': 79990000000 + i,
+             'number_of_people': 1, 'tour_id': tours + 1}
+            for i in range(1, users // 10 + 1)
+        ])
+    archive_past_tours()
+    with SessionLocal() as sessionloc:
+        rebuild_stats(sessionloc)
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('budget')
+    profile_dir = workdir / 'profiles'
+    (profile_dir / 'tours_page').mkdir(parents=True)
+    (profile_dir / 'tours_page' / 'budget.folded').write_text('main 1\n')
+
+    mail = run.app.extensions['mail']
+    saved_config = {key: run.app.config[key] for key in ('UPLOAD_FOLDER', 'PROFILE_DIR')}
+    saved_suppress = mail.suppress
+    run.app.config.update(UPLOAD_FOLDER=str(workdir), PROFILE_DIR=str(profile_dir))
+    mail.suppress = True
+    yield run.app
+    run.app.config.update(saved_config)
+    mail.suppress = saved_suppress
+
+
+@pytest.fixture(scope='module', params=SIZES, ids=lambda size: f'{size[0]}x{size[1]}')
+def database(request, app):
+    tours, users = request.param
+    seed_database(tours, users)
+    COUNTS[request.param] = {}
+    return request.param
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['userLogged'] = 'admin'
+    return client
+
+
+def test_all_routes_have_budgets(app):
+    routes = {(rule.endpoint, method) for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+              for method in rule.methods - {'HEAD', 'OPTIONS'}}
+    assert sorted(routes - set(BUDGETS)) == []
+
+
+def test_all_budgets_have_cases():
+    assert sorted(set(BUDGETS) - {(endpoint, method) for endpoint, method, _, _ in CASES}) == []
+
+
+@pytest.mark.parametrize('endpoint, method, path, data', CASES, ids=[f'{case[0]}-{case[1]}' for case in CASES])
+def test_query_budget(database, client, endpoint, method, path, data):
+    tours, users = database
+    if endpoint == 'add_tour_page' and data:
+        data = dict(data, image_path=(BytesIO(b'image'), 'budget.jpg'))
+    # Отдельный адрес для каждого запроса, чтобы не упираться в ограничение частоты клиента
+    environ = {'REMOTE_ADDR': f'10.0.{len(COUNTS[database])}.{tours % 256}'}
+
+    with QueryCounter() as counter:
+        response = client.open(path.format(tours=tours), method=method, data=data, environ_base=environ)
+    assert response.status_code < 400, f'{method} {path} вернул {response.status_code}'
+
+    key = (endpoint, method)
+    budget = BUDGETS[key]
+    rows = tours + users
+    COUNTS[database][key] = counter.count
+    assert counter.count <= budget.max_queries + budget.per_row * rows, '\n'.join(counter.statements)
+
+    # Сравнение с меньшей базой: число запросов не должно расти быстрее объявленного прироста
+    smaller = [size for size in COUNTS if sum(size) < rows and key in COUNTS[size]]
+    for size in smaller:
+        growth = counter.count - COUNTS[size][key]
+        assert growth <= budget.per_row * (rows - sum(size)), \
+            f'число запросов растет с размером базы ({COUNTS[size][key]} -> {counter.count})'
@@ -0,0 +1,79 @@
+"""
+Проверка контроля допуска (limits/rate_limit.py) для хранилища в памяти и общего хранилища SQLite.
+
+Запуск из корня репозитория:
+    python -m pytest tests/test_rate_limit.py
+"""
+
+import sqlite3
+
+import pytest
+
+from limits import rate_limit
+from limits.rate_limit import MemoryBackend, SQLiteBackend, GLOBAL_KEY
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / 'limits.db'))
+
+
+def admit(backend, client_key):
+    decision = backend.admit(client_key)
+    if not decision.status:
+        backend.release_writer(decision.slot)
+    return decision.status
+
+
+def test_abusive_client_does_not_lock_out_others(backend):
+    statuses = [admit(backend, 'client:6.6.6.6') for _ in range(200)]
+    assert statuses.count(None) == rate_limit.CLIENT_CAPACITY
+    assert set(statuses[rate_limit.CLIENT_CAPACITY:]) == {429}
+    assert admit(backend, 'client:1.2.3.4') is None
+
+
+def test_global_rejection_does_not_spend_client_token(backend):
+    for number in range(rate_limit.GLOBAL_CAPACITY):
+        assert admit(backend, f'client:10.0.0.{number}') is None
+    for _ in range(rate_limit.CLIENT_CAPACITY + 1):
+        assert backend.admit('client:1.2.3.4').reason == 'глобальный лимит'
+
+
+def test_writer_limit(backend):
+    slots = [backend.admit(f'client:10.0.0.{number}') for number in range(rate_limit.MAX_CONCURRENT_WRITERS)]
+    assert all(decision.status is None for decision in slots)
+    assert backend.admit('client:1.2.3.4').status == 503
+    backend.release_writer(slots[0].slot)
+    assert admit(backend, 'client:1.2.3.4') is None
+
+
+def test_full_buckets_are_evicted(backend, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'SWEEP_INTERVAL', 0)
+    admit(backend, 'client:1.2.3.4')
+    # Корзины пополнятся до емкости к моменту следующей очистки
+    monkeypatch.setattr(rate_limit, 'CLIENT_RATE', 10 ** 6)
+    monkeypatch.setattr(rate_limit, 'GLOBAL_RATE', 10 ** 6)
+    if isinstance(backend, MemoryBackend):
+        backend._buckets = {key: (tokens, updated, 0) for key, (tokens, updated, _) in backend._buckets.items()}
+        admit(backend, 'client:5.6.7.8')
+        keys = set(backend._buckets)
+    else:
+        backend._connection().execute('UPDATE buckets SET full_at = 0')
+        admit(backend, 'client:5.6.7.8')
+        keys = {key for key, in backend._connection().execute('SELECT key FROM buckets')}
+    assert keys == {'client:5.6.7.8', GLOBAL_KEY}
+
+
+def test_locked_storage_fails_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'STORAGE_TIMEOUT', 0.05)
+    backend = SQLiteBackend(str(tmp_path / 'limits.db'))
+    locker = sqlite3.connect(str(tmp_path / 'limits.db'), isolation_level=None)
+    locker.execute('BEGIN IMMEDIATE')
+    try:
+        assert backend.admit('client:1.2.3.4').status == 503
+    finally:
+        locker.execute('ROLLBACK')
+        locker.close()
+    assert admit(backend, 'client:1.2.3.4') is None